@@ -15,5 +15,97 @@ NOTIFICATION_TYPE = os.getenv("NOTIFICATION_TYPE")
 
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_USER_ID = os.getenv("SLACK_USER_ID")
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
 
-GMAIL_CREDENTIALS_JSON = os.getenv("GMAIL_CREDENTIALS_JSON")
\ No newline at end of file
+GMAIL_CREDENTIALS_JSON = os.getenv("GMAIL_CREDENTIALS_JSON")
+
+# upstream retrieval (seconds each source may take before we answer without it)
+PUBMED_TIMEOUT = float(os.getenv("PUBMED_TIMEOUT", "20"))
+EUROPE_PMC_TIMEOUT = float(os.getenv("EUROPE_PMC_TIMEOUT", "15"))
+CLINICAL_TRIALS_TIMEOUT = float(os.getenv("CLINICAL_TRIALS_TIMEOUT", "20"))
+
+# shared HTTP client for the literature APIs
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+HTTP_MAX_BACKOFF = float(os.getenv("HTTP_MAX_BACKOFF", str(HTTP_BACKOFF_FACTOR * 2 ** HTTP_MAX_RETRIES)))  # also caps Retry-After
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")  # raises the E-utilities limit from 3 to 10 requests/second
+NCBI_RATE_LIMIT = float(os.getenv("NCBI_RATE_LIMIT", "10" if NCBI_API_KEY else "3"))
+EUROPE_PMC_RATE_LIMIT = float(os.getenv("EUROPE_PMC_RATE_LIMIT", "10"))
+
+# upstream response cache (set CACHE_DB_PATH to keep entries across restarts)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH")
+CACHE_DB_MAX_ENTRIES = int(os.getenv("CACHE_DB_MAX_ENTRIES", "5000"))
+CACHE_TTL_PUBMED = int(os.getenv("CACHE_TTL_PUBMED", str(6 * 3600)))
+CACHE_TTL_EUROPE_PMC = int(os.getenv("CACHE_TTL_EUROPE_PMC", str(6 * 3600)))
+CACHE_TTL_CLINICAL_TRIALS = int(os.getenv("CACHE_TTL_CLINICAL_TRIALS", str(12 * 3600)))
+
+# per-PMID store of parsed PubMed records, efetch is only called for PMIDs not in here
+PUBMED_EFETCH_BATCH_SIZE = int(os.getenv("PUBMED_EFETCH_BATCH_SIZE", "200"))
+PUBMED_ARTICLE_STORE_SIZE = int(os.getenv("PUBMED_ARTICLE_STORE_SIZE", "20000"))
+PUBMED_ARTICLE_TTL = int(os.getenv("PUBMED_ARTICLE_TTL", str(7 * 24 * 3600)))
+
+# relevance ranking of the merged PubMed + Europe PMC results
+RANKING_TOP_K = int(os.getenv("RANKING_TOP_K", "20"))
+
+# prompt assembly (token counts are local, tiktoken when available)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_MAX_ARTICLE_TOKENS = int(os.getenv("PROMPT_MAX_ARTICLE_TOKENS", "400"))
+PROMPT_TRIALS_SHARE = float(os.getenv("PROMPT_TRIALS_SHARE", "0.25"))  # max fraction of the budget for trial rows
+
+# durable background queue for memory storage and notifications
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # seconds, doubled after every failed attempt
+JOB_LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", "300"))  # seconds before a running job counts as abandoned
+
+# embeddings: concurrent requests inside the window are sent as one API call
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_BATCH_WINDOW = float(os.getenv("EMBEDDING_BATCH_WINDOW", "0.02"))  # seconds
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+
+# conversation memory backend: "pinecone" or "local" (memory-mapped NumPy matrix on disk)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "vector_store")
+LOCAL_ANN_THRESHOLD = int(os.getenv("LOCAL_ANN_THRESHOLD", "50000"))  # rows before switching to HNSW (if hnswlib is installed)
+
+# multi-turn memory: prior turns fed back into the prompt, literature reused for follow-ups
+CONTEXT_TURNS = int(os.getenv("CONTEXT_TURNS", "4"))
+CONTEXT_TOKEN_CAP = int(os.getenv("CONTEXT_TOKEN_CAP", "800"))
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "256"))
+CONVERSATION_CACHE_TTL = int(os.getenv("CONVERSATION_CACHE_TTL", str(30 * 60)))
+
+# semantic cache for final summaries (similarity of query embeddings)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+# a summary is never fresher than the literature behind it, so default to the shortest source TTL
+SEMANTIC_CACHE_TTL = int(os.getenv(
+    "SEMANTIC_CACHE_TTL", str(min(CACHE_TTL_PUBMED, CACHE_TTL_EUROPE_PMC, CACHE_TTL_CLINICAL_TRIALS))
+))
+
+# upstream endpoints, overridable so benchmarks can point them at a local stand-in server
+PUBMED_BASE_URL = os.getenv("PUBMED_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+EUROPE_PMC_BASE_URL = os.getenv("EUROPE_PMC_BASE_URL", "https://www.ebi.ac.uk/europepmc/webservices/rest")
+CLINICAL_TRIALS_BASE_URL = os.getenv("CLINICAL_TRIALS_BASE_URL", "https://clinicaltrials.gov/api/v2/")
+
+# watched conditions: digests refreshed in the background and served straight from /api/chat
+WATCHLIST = [condition.strip() for condition in os.getenv("WATCHLIST", "").split(",") if condition.strip()]
+DIGEST_DB_PATH = os.getenv("DIGEST_DB_PATH", "digests.db")
+DIGEST_INTERVAL = int(os.getenv("DIGEST_INTERVAL", str(6 * 3600)))  # seconds between refreshes, 0 turns the scheduler off
+DIGEST_MAX_AGE = int(os.getenv("DIGEST_MAX_AGE", str(2 * DIGEST_INTERVAL)))  # older digests are not served
+DIGEST_LOOKBACK_DAYS = int(os.getenv("DIGEST_LOOKBACK_DAYS", "30"))  # window of the first refresh of a condition
+DIGEST_MAX_ARTICLES = int(os.getenv("DIGEST_MAX_ARTICLES", "300"))  # literature kept per condition between refreshes
+
+# /api/chat/batch: queries per call, and queries processed (so LLM calls in flight) at once
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# external clients are created on first use; a failed one is retried after this many seconds
+CLIENT_RETRY_INTERVAL = float(os.getenv("CLIENT_RETRY_INTERVAL", "30"))
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.0"))  # seconds main.py may take to import, a warning is logged above it
@@ -1,16 +1,29 @@
+import time
+_import_started = time.perf_counter() # everything below counts towards IMPORT_TIME_BUDGET
 import uvicorn
-from fastapi import FastAPI
-from routers import chat
+from uuid import uuid4
+from fastapi import FastAPI, Request
+from starlette.routing import Match
+from routers import chat, metrics, watchlist, health
+from services.jobs import job_queue
+from services.digests import digest_scheduler
+from services.clients import warm_up_clients
+from services.metrics import RequestIdFilter, request_id_var, stage_duration, http_requests
+from config import IMPORT_TIME_BUDGET
 import logging
 
+log_handler = logging.FileHandler("app.log", encoding="utf-8")
+log_handler.addFilter(RequestIdFilter()) # every line carries the ID of the request that produced it
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    format="%(asctime)s [%(levelname)s] [%(request_id)s] %(name)s: %(message)s",
     handlers=[
-        logging.FileHandler("app.log", encoding="utf-8")
+        log_handler
     ]
 )
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="Agentic AI-driven Research Summerizing Assistant",
     description="FastAPI microservice using OpenAI models for stock insights and conversation memory",
@@ -18,6 +31,76 @@ app = FastAPI(
 )
 
 app.include_router(chat.router, prefix="/api", tags=["Chat"]) # include router
+app.include_router(watchlist.router, prefix="/api", tags=["Watchlist"])
+app.include_router(metrics.router, tags=["Metrics"])
+app.include_router(health.router, tags=["Health"])
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+def _route_label(request: Request) -> str:
+    """
+    The template of the route that served the request, e.g. /api/watchlist/{condition},
+    or "unmatched", so metric labels stay bounded whatever paths clients send.
+    """
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in request.app.router.routes:
+            match, _ = candidate.matches(request.scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+            if match == Match.PARTIAL and route is None:
+                route = candidate # right path, wrong method
+    return getattr(route, "path", None) or "unmatched"
+
+def _observe_request(request: Request, status: int, started: float) -> None:
+    route = _route_label(request)
+    stage_duration.observe(time.perf_counter() - started, stage="request", path=route)
+    http_requests.inc(path=route, status=str(status))
+
+async def _timed_body(body, request: Request, status: int, started: float):
+    # the request is timed until its last chunk is sent, so streamed answers such as
+    # /api/chat/stream count their whole generation and not just the headers
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        _observe_request(request, status, started)
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # reuse the caller's request ID when given so logs can be joined across services
+    request_id = request.headers.get("X-Request-ID") or uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        _observe_request(request, 500, started)
+        raise
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    response.body_iterator = _timed_body(response.body_iterator, request, response.status_code, started)
+    return response
+
+@app.on_event("startup")
+def start_job_workers():
+    stage_duration.observe(IMPORT_SECONDS, stage="import")
+    if IMPORT_SECONDS > IMPORT_TIME_BUDGET:
+        logger.warning("Importing the app took %.2fs, over the %.2fs budget.", IMPORT_SECONDS, IMPORT_TIME_BUDGET)
+    else:
+        logger.info("Imported the app in %.2fs.", IMPORT_SECONDS)
+
+    job_queue.start() # memory storage and notifications run in the background
+    digest_scheduler.start() # digests of watched conditions are refreshed ahead of the questions
+    # external clients connect in the background, /health/ready reports when they are done
+    warm_up_clients()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    digest_scheduler.stop()
+    job_queue.stop()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", reload=True, log_level="info")
\ No newline at end of file
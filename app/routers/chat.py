@@ -1,23 +1,197 @@
 # app/routers/chat.py
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-from fastapi import APIRouter
-from schemas import UserQuery, ChatResponse
-from services.memory import init_pinecone, store_conversation
-from services.pubmed import (fetch_pubmed_articles, 
-                             fetch_europe_pmc_articles,
-                             fetch_new_drug_development_trials,)
-from services.llm import summarize_info
-from services.utils import (process_article_for_summary,
-                            select_disease_informed_articles,)
-from services.notification import send_slack_dm, create_gmail_draft
-from config import NOTIFICATION_TYPE
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from schemas import UserQuery, ChatResponse, BatchQuery, BatchItemResult, BatchResponse
+from services.memory import get_vector_store, store_conversation, retrieve_context
+from services.cache import conversation_cache
+from services.semantic_cache import semantic_cache
+from services.digests import digest_store
+from services.pubmed import fetch_all_sources, fetch_pubmed_batch
+from services.llm import summarize_info, stream_summary
+from services.utils import select_disease_informed_articles, deduplicate_articles
+from services.ranking import covers
+from services.prompt import build_prompt
+from services.notification import send_slack_dm, create_gmail_draft, combine_summaries
+from services.jobs import job_queue, register_job
+from config import NOTIFICATION_TYPE, CONTEXT_TURNS, CONVERSATION_CACHE_TTL, BATCH_MAX_QUERIES, BATCH_CONCURRENCY
 import logging
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 router = APIRouter()
-index = init_pinecone()  # initialize Pinecone index once
+
+def _conversation_history(conversation_id: str, query: str) -> list:
+    # earlier turns are a nice-to-have, the answer should not fail without them
+    try:
+        return retrieve_context(conversation_id, query, k=CONTEXT_TURNS)
+    except Exception as e:
+        logger.error("Error retrieving conversation context: %s", e, exc_info=True)
+        return []
+
+def _reusable_literature(user_input: UserQuery, conversation_id: str):
+    # the literature fetched earlier in this conversation, when it mentions everything the
+    # question is about; otherwise the question gets a fresh fetch
+    cached = conversation_cache.get(conversation_id)
+    if cached is not None and covers(user_input.query, cached["articles"]):
+        return cached
+    return None
+
+def prepare_prompt(user_input: UserQuery, conversation_id: str, prefetched: dict = None):
+    """
+    Fetch, rank and pack everything the LLM needs. Yields (event, data) progress tuples;
+    the last one is ("prompt", (system_prompt, user_prompt, usage)). `prefetched` holds
+    source results already fetched by the caller (see fetch_all_sources).
+    """
+    # --- follow-up questions reuse the literature already fetched for this conversation ---
+    cached = _reusable_literature(user_input, conversation_id)
+    relevant_articles = []
+    if cached is not None:
+        relevant_articles = select_disease_informed_articles(user_input, cached["articles"])
+
+    if relevant_articles:
+        logger.info("Reusing literature fetched earlier in this conversation.")
+        new_drug_clinical_trials = cached["trials"]
+        yield "sources", {
+            "reused": True,
+            "articles": len(cached["articles"]),
+            "clinical_trials": len(new_drug_clinical_trials[0]),
+        }
+    else:
+        # --- fetching all the data needed from APIs. ---
+        logger.info("Fetching PubMed, Europe PMC and clinical trials concurrently...")
+        sources = fetch_all_sources(user_input, max_results=200, prefetched=prefetched)
+        news_data_pubmed = sources["pubmed"]
+        news_data_EUpmc = sources["europe_pmc"]
+        new_drug_clinical_trials = sources["clinical_trials"]
+        yield "sources", {
+            "pubmed": len(news_data_pubmed),
+            "europe_pmc": len(news_data_EUpmc),
+            "clinical_trials": len(new_drug_clinical_trials[0]),
+        }
+
+        # --- drop articles both sources returned, then attatch all the parts of the abstracts from relevent articles---
+        articles, dedup_stats = deduplicate_articles(news_data_pubmed + news_data_EUpmc)
+        logger.info(f"Deduplicated articles: {dedup_stats}")
+        conversation_cache.set(conversation_id, {"articles": articles, "trials": new_drug_clinical_trials}, CONVERSATION_CACHE_TTL)
+        logger.info("Selecting disease-informed articles...")
+        relevant_articles= select_disease_informed_articles(user_input, articles) # rank articles from both sources for the specific disease
+
+    yield "articles", {
+        "selected": len(relevant_articles),
+        "titles": [article.title for article in relevant_articles[:10]],
+    }
+
+    # --- bring back the most relevant earlier turns of this conversation ---
+    history = []
+    if user_input.conversation_id:
+        history = _conversation_history(conversation_id, user_input.query.strip())
+        yield "history", {"turns": len(history)}
+
+    # --- pack the ranked articles, earlier turns and trial rows into the prompt token budget ---
+    system_prompt, user_prompt, prompt_usage = build_prompt(relevant_articles, new_drug_clinical_trials, history=history)
+    logger.info(f"Prompt token usage: {prompt_usage}")
+    yield "prompt", (system_prompt, user_prompt, prompt_usage)
+
+@register_job("store_conversation")
+def store_conversation_job(payload: dict) -> None:
+    store_conversation(get_vector_store(), payload["user_query"], payload["response"], payload["conversation_id"])
+
+@register_job("notify")
+def notify_job(payload: dict) -> None:
+    # --- choose which notification method to use ---
+    notification_type = payload["notification_type"]
+    if notification_type == "slack":
+        sent = send_slack_dm(payload["message"])
+    elif notification_type == "gmail":
+        sent = create_gmail_draft(payload["message"])
+    else:
+        return
+    if not sent:
+        raise RuntimeError(f"{notification_type} notification failed") # let the queue retry it
+    logger.info(f"{notification_type} notification sent.")
+
+def finalize_response(user_query: str, final_response: str, conversation_id: str, notify: bool = True) -> None:
+    """
+    Everything that happens once the summary exists. Only the local copy is written here;
+    memory storage and notification are queued so the response is not held up by them.
+    `notify` is off for watched-condition digests, which the scheduler already sent out.
+    """
+    # write the output on a text file
+    with open("example.txt", "w", encoding="utf-8") as file:
+        file.write(final_response)
+
+    # --- store the conversation in vector databse with conversation ID so we knwo the user.---
+    job_queue.enqueue("store_conversation", {
+        "user_query": user_query,
+        "response": final_response,
+        "conversation_id": conversation_id,
+    })
+
+    notification_type = (NOTIFICATION_TYPE or "").lower()
+    if notify and notification_type in ("slack", "gmail"):
+        job_queue.enqueue("notify", {"notification_type": notification_type, "message": final_response})
+
+def is_follow_up(user_input: UserQuery) -> bool:
+    # a question sent with a conversation ID is answered from that conversation's earlier
+    # turns and literature (see prepare_prompt), so its answer belongs to that conversation
+    return bool(user_input.conversation_id)
+
+def watched_digest(user_input: UserQuery, conversation_id: str):
+    """
+    Pre-computed digest when the question is about a watched condition, or None. Like the
+    semantic cache it only answers the first question of a conversation; the digest's
+    literature is kept for the follow-ups.
+    """
+    if user_input.bypass_cache or is_follow_up(user_input):
+        return None
+    try:
+        digest = digest_store.fresh(user_input.query)
+    except Exception as e:
+        logger.error("Error reading the digest store: %s", e, exc_info=True)
+        return None
+    if digest is None:
+        return None
+    logger.info(f"Serving the pre-computed digest for watched condition: {user_input.query.strip()}")
+    conversation_cache.set(conversation_id, {"articles": digest["articles"], "trials": digest["trials"]}, CONVERSATION_CACHE_TTL)
+    return digest["response"]
+
+def cached_summary(user_input: UserQuery, conversation_id: str):
+    """
+    Summary of a near-identical earlier question, or None. Skipped when the caller asks to
+    bypass the cache and for follow-ups, whose answer depends on their conversation. Like
+    a digest, a hit hands the literature behind the summary on to the follow-ups.
+    """
+    if user_input.bypass_cache or is_follow_up(user_input):
+        semantic_cache.record_bypass()
+        return None
+    try:
+        hit = semantic_cache.lookup(user_input.query.strip())
+    except Exception as e:
+        logger.error("Error looking up the semantic cache: %s", e, exc_info=True)
+        return None
+    if hit is None:
+        return None
+    response, similarity, cached_query, literature = hit
+    logger.info(f"Semantic cache hit (similarity {similarity:.3f}) for earlier query: {cached_query}")
+    if literature is not None:
+        conversation_cache.set(conversation_id, literature, CONVERSATION_CACHE_TTL)
+    return response
+
+def remember_summary(user_input: UserQuery, final_response: str, conversation_id: str) -> None:
+    # only standalone answers are shared; a follow-up's answer would leak its conversation
+    if is_follow_up(user_input):
+        return
+    try:
+        # keep the literature the summary came from so a hit can seed its conversation too
+        literature = conversation_cache.get(conversation_id)
+        semantic_cache.store(user_input.query.strip(), final_response, literature)
+    except Exception as e:
+        logger.error("Error storing summary in the semantic cache: %s", e, exc_info=True)
 
 @router.post("/chat", response_model=ChatResponse)
 def chat_endpoint(user_input: UserQuery):
@@ -26,70 +200,150 @@ def chat_endpoint(user_input: UserQuery):
     logger.info(f"New chat request received with onversation ID: {conversation_id}")
     logger.debug(f"User query: {user_query}")
 
-    # --- fetching all the data needed from APIs. ---
-    logger.info("Fetching PubMed articles...")
-    news_data_pubmed = fetch_pubmed_articles(user_input, max_results=200)
-    news_data_EUpmc = fetch_europe_pmc_articles(user_input, max_results=200) # to be explored in the future if needed.
-    logger.info("Fetching new drug development clinical trials...")
-    new_drug_clinical_trials = fetch_new_drug_development_trials(user_input)
-    
-    # --- attatch all the parts of the abstracts from relevent articles---
-    logger.info("Selecting disease-informed articles...")
-    relevant_articles= select_disease_informed_articles(user_input,news_data_pubmed) #filter new articles for the specific disease
-    llm_input=[]
-    for r_a in relevant_articles:
-        llm_input.append(process_article_for_summary(r_a))
-    logger.debug(f"Processed article summaries: {llm_input}")
-
-    # use the top 10 headlines only (adjust as needed)
-    news_titles = [article["title"] for article in relevant_articles[:10]]
-    short_news_text = "\n".join(news_titles)
-    logger.info(f"Short news text compiled: {short_news_text}")
+    digest = watched_digest(user_input, conversation_id)
+    if digest is not None:
+        finalize_response(user_query, digest, conversation_id, notify=False)
+        return ChatResponse(response=digest, conversation_id=conversation_id, cached=True)
+
+    cached = cached_summary(user_input, conversation_id)
+    if cached is not None:
+        finalize_response(user_query, cached, conversation_id)
+        return ChatResponse(response=cached, conversation_id=conversation_id, cached=True)
+
+    for event, data in prepare_prompt(user_input, conversation_id):
+        if event == "prompt":
+            system_prompt, user_prompt, _ = data
 
     # --- summarize the News with the LLM ---
     logger.info("Generating LLM summary...")
-    system_prompt = (
-        "You are a helpful pharmaceutical assistant with in-depth knowledge of new drug development and clinical trials."
-    )
-    user_prompt = f"""
-    Article Headlines: {short_news_text}
+    llm_summary = summarize_info(system_prompt, user_prompt)
+    final_response = f"{llm_summary}" # convert to string
+    logger.info("LLM summary generated successfully.")
+
+    remember_summary(user_input, final_response, conversation_id)
+    finalize_response(user_query, final_response, conversation_id)
+
+    return ChatResponse(
+        response=final_response,
+        conversation_id=conversation_id
+    ) # return the final response to the client.
+
+def _batch_item(user_input: UserQuery, conversation_id: str, prefetched: dict) -> BatchItemResult:
+    user_query = user_input.query.strip()
+    for event, data in prepare_prompt(user_input, conversation_id, prefetched):
+        if event == "prompt":
+            system_prompt, user_prompt, _ = data
 
-    Article Context and Detail: {llm_input}
+    final_response = f"{summarize_info(system_prompt, user_prompt)}"
+    remember_summary(user_input, final_response, conversation_id)
+    finalize_response(user_query, final_response, conversation_id, notify=False)
+    return BatchItemResult(query=user_query, response=final_response, conversation_id=conversation_id)
 
-    Clinical Trial News: {new_drug_clinical_trials[0]}
+@router.post("/chat/batch", response_model=BatchResponse)
+def chat_batch_endpoint(batch: BatchQuery):
+    """
+    Several queries in one call. Watched-condition digests and cached summaries answer
+    first; PubMed is then searched for every remaining query and their articles downloaded
+    together, and the queries are summarized BATCH_CONCURRENCY at a time. Each query gets
+    its own result or error. With `notify`, all summaries go out as one notification.
+    """
+    if len(batch.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=422, detail=f"at most {BATCH_MAX_QUERIES} queries per batch")
+    logger.info(f"New batch request received with {len(batch.queries)} queries")
+
+    results = [None] * len(batch.queries)
+    pending = []
+    for position, user_input in enumerate(batch.queries):
+        conversation_id = user_input.conversation_id or str(uuid4())
+        user_query = user_input.query.strip()
+        answer = watched_digest(user_input, conversation_id)
+        if answer is None:
+            answer = cached_summary(user_input, conversation_id)
+        if answer is None:
+            pending.append((position, user_input, conversation_id))
+            continue
+        finalize_response(user_query, answer, conversation_id, notify=False)
+        results[position] = BatchItemResult(query=user_query, response=answer, conversation_id=conversation_id, cached=True)
+
+    # follow-ups that reuse their conversation's literature are not prefetched
+    fetch_queries = [user_input.query.strip() for _, user_input, conversation_id in pending
+                     if _reusable_literature(user_input, conversation_id) is None]
+    pubmed = fetch_pubmed_batch(fetch_queries, max_results=200) if fetch_queries else {}
+
+    def run(position: int, user_input: UserQuery, conversation_id: str):
+        prefetched = {"pubmed": pubmed[user_input.query.strip()]} if user_input.query.strip() in pubmed else None
+        try:
+            return position, _batch_item(user_input, conversation_id, prefetched)
+        except Exception as e:
+            logger.error("Error processing batch query '%s': %s", user_input.query, e, exc_info=True)
+            return position, BatchItemResult(query=user_input.query.strip(), conversation_id=conversation_id, error=str(e))
 
-    Newly Trialed Drugs: {new_drug_clinical_trials[1]}
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="chat-batch") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, *item) for item in pending] # keep the request ID in the logs
+        for future in futures:
+            position, result = future.result()
+            results[position] = result
 
-    Provide a concise summary with two sections:
+    answered = [(result.query, result.response) for result in results if result.error is None]
+    notification_type = (NOTIFICATION_TYPE or "").lower()
+    if batch.notify and answered and notification_type in ("slack", "gmail"):
+        message = combine_summaries(f"Summaries for {len(answered)} queries", answered)
+        job_queue.enqueue("notify", {"notification_type": notification_type, "message": message})
 
-    Section 1: Drug Development Summary
-    - Summarize the overall news and insights regarding the drug development related to the specified disease.
+    return BatchResponse(results=results, succeeded=len(answered), failed=len(results) - len(answered))
 
-    Section 2: New Drug Details
-    - List the names of the newest drugs mentioned and briefly describe what each drug does.
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+def chat_stream_endpoint(user_input: UserQuery):
+    """
+    Server-Sent Events version of /chat: progress events while sources are fetched and
+    ranked, then `token` events as the LLM writes, then `done` with the full response.
     """
+    conversation_id = user_input.conversation_id or str(uuid4())
+    user_query = user_input.query.strip()
+    logger.info(f"New streaming chat request received with conversation ID: {conversation_id}")
 
-    llm_summary = summarize_info(system_prompt, user_prompt)
-    final_response = f"{llm_summary}" # convert to string
-    logger.info("LLM summary generated successfully.")
+    def events():
+        yield _sse("start", {"conversation_id": conversation_id})
+        digest = watched_digest(user_input, conversation_id)
+        if digest is not None:
+            finalize_response(user_query, digest, conversation_id, notify=False)
+            yield _sse("done", {"response": digest, "conversation_id": conversation_id, "cached": True})
+            return
 
-    # write the output on a text file
-    with open("example.txt", "w", encoding="utf-8") as file: 
-        file.write(final_response)
-        
-    # --- store the conversation in vector databse with conversation ID so we knwo the user.---
-    store_conversation(index, user_query, final_response, conversation_id)
-    
-    # --- choose which notification method to use ---
-    notification_type = NOTIFICATION_TYPE.lower()
-    if notification_type == "slack":
-        send_slack_dm(final_response)
-        logger.info("Slack DM notification sent.")
-    elif notification_type == "gmail":
-        create_gmail_draft(final_response)
-        logger.info("Gmail draft notification created.")
+        cached = cached_summary(user_input, conversation_id)
+        if cached is not None:
+            finalize_response(user_query, cached, conversation_id)
+            yield _sse("done", {"response": cached, "conversation_id": conversation_id, "cached": True})
+            return
 
-    return ChatResponse(
-        response=final_response,
-        conversation_id=conversation_id
-    ) # return the final response to the client.
+        try:
+            for event, data in prepare_prompt(user_input, conversation_id):
+                if event == "prompt":
+                    system_prompt, user_prompt, prompt_usage = data
+                    yield _sse("prompt", prompt_usage)
+                else:
+                    yield _sse(event, data)
+
+            logger.info("Streaming LLM summary...")
+            pieces = []
+            for piece in stream_summary(system_prompt, user_prompt):
+                pieces.append(piece)
+                yield _sse("token", {"text": piece})
+            final_response = "".join(pieces).strip()
+        except Exception as e:
+            logger.error("Error while streaming chat response: %s", e, exc_info=True)
+            yield _sse("error", {"detail": str(e)})
+            return
+
+        remember_summary(user_input, final_response, conversation_id)
+        finalize_response(user_query, final_response, conversation_id)
+        yield _sse("done", {"response": final_response, "conversation_id": conversation_id, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
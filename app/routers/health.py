@@ -0,0 +1,30 @@
+# app/routers/health.py
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.clients import client_statuses, warm_up_clients
+
+router = APIRouter()
+
+@router.get("/health/live")
+def liveness():
+    """
+    The process is up and serving. Touches no external service.
+    """
+    return {"status": "ok"}
+
+@router.get("/health/ready")
+def readiness():
+    """
+    Ready once every client the configuration uses (OpenAI, the vector store, Slack or
+    Gmail) has been initialized by the background warm-up. The probe itself never waits
+    on a client: while one is not ready it starts another warm-up, and a client that
+    failed is retried there after CLIENT_RETRY_INTERVAL seconds.
+    """
+    clients = client_statuses()
+    ready = all(client["status"] in ("ready", "disabled") for client in clients.values())
+    if not ready:
+        warm_up_clients()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "clients": clients},
+    )
@@ -0,0 +1,36 @@
+# app/routers/watchlist.py
+from typing import List
+from fastapi import APIRouter, HTTPException
+from schemas import WatchlistItem, WatchlistEntry
+from services.digests import digest_store, digest_scheduler, normalize_condition
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter()
+
+@router.get("/watchlist", response_model=List[WatchlistEntry])
+def list_watchlist():
+    return [WatchlistEntry(**entry) for entry in digest_store.watchlist()]
+
+@router.post("/watchlist", response_model=WatchlistEntry, status_code=201)
+def watch_condition(item: WatchlistItem):
+    """
+    Watch a condition: its digest is built in the background and kept fresh by the scheduler.
+    """
+    condition = item.condition.strip()
+    if not condition:
+        raise HTTPException(status_code=422, detail="condition must not be empty")
+    if digest_store.watch(condition):
+        logger.info(f"Now watching: {condition}")
+        digest_scheduler.wake()
+    key = normalize_condition(condition)
+    entry = next(entry for entry in digest_store.watchlist() if normalize_condition(entry["condition"]) == key)
+    return WatchlistEntry(**entry)
+
+@router.delete("/watchlist/{condition}", status_code=204)
+def unwatch_condition(condition: str):
+    if not digest_store.unwatch(condition):
+        raise HTTPException(status_code=404, detail="condition is not on the watchlist")
+    logger.info(f"Stopped watching: {condition}")
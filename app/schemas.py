@@ -1,10 +1,37 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class UserQuery(BaseModel):
     query: str
     conversation_id: Optional[str] = None
+    bypass_cache: bool = False  # skip the semantic cache and always run the full pipeline
 
 class ChatResponse(BaseModel):
     response: str
-    conversation_id: Optional[str] = None
\ No newline at end of file
+    conversation_id: Optional[str] = None
+    cached: bool = False
+
+class BatchQuery(BaseModel):
+    queries: List[UserQuery]
+    notify: bool = True  # one notification with every summary, instead of one per query
+
+class BatchItemResult(BaseModel):
+    query: str
+    response: Optional[str] = None
+    conversation_id: Optional[str] = None
+    cached: bool = False
+    error: Optional[str] = None  # set instead of response when this query failed
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int = 0
+    failed: int = 0
+
+class WatchlistItem(BaseModel):
+    condition: str
+
+class WatchlistEntry(BaseModel):
+    condition: str
+    has_digest: bool = False
+    updated_at: Optional[float] = None  # when the summary was last regenerated
+    checked_at: Optional[float] = None  # when the sources were last checked for new literature
\ No newline at end of file
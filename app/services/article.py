@@ -0,0 +1,121 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# very common words that would otherwise match every abstract
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were with "
+    "we our these those which new".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class Article:
+    """
+    Immutable record for one article, whichever source it came from. Built once when the
+    upstream response is parsed; the abstract is normalized into (label, text) sections and
+    the search terms of the title and abstract are tokenized on first use and then kept.
+    """
+    __slots__ = (
+        "source", "id", "title", "sections", "journal", "doi", "date", "url", "pmid", "authors",
+        "_title_terms", "_abstract_terms", "_title_lower",
+    )
+
+    def __init__(self,
+                 source: str,
+                 id: str,
+                 title: str,
+                 sections: Iterable[Tuple[str, str]] = (),
+                 journal: str = "",
+                 doi: str = "",
+                 date: str = "",
+                 url: str = "",
+                 pmid: str = "",
+                 authors: str = ""):
+        set_ = object.__setattr__
+        set_(self, "source", source)
+        set_(self, "id", id)
+        set_(self, "title", title or "")
+        set_(self, "sections", tuple((label or "", text) for label, text in sections if text))
+        set_(self, "journal", journal or "")
+        set_(self, "doi", (doi or "").lower())
+        set_(self, "date", date or "")
+        set_(self, "url", url or "")
+        set_(self, "pmid", pmid or "")
+        set_(self, "authors", authors or "")
+        set_(self, "_title_terms", None)
+        set_(self, "_abstract_terms", None)
+        set_(self, "_title_lower", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Article is immutable")
+
+    def __repr__(self):
+        return f"Article(source={self.source!r}, id={self.id!r}, title={self.title[:60]!r})"
+
+    @property
+    def abstract_text(self) -> str:
+        return " ".join(text for _, text in self.sections)
+
+    @property
+    def title_lower(self) -> str:
+        if self._title_lower is None:
+            object.__setattr__(self, "_title_lower", self.title.lower())
+        return self._title_lower
+
+    @property
+    def title_terms(self) -> Tuple[str, ...]:
+        """
+        Title tokens without stopwords, used for ranking.
+        """
+        if self._title_terms is None:
+            object.__setattr__(self, "_title_terms", tuple(tokenize(self.title)))
+        return self._title_terms
+
+    @property
+    def abstract_terms(self) -> Tuple[str, ...]:
+        if self._abstract_terms is None:
+            object.__setattr__(self, "_abstract_terms", tuple(tokenize(self.abstract_text)))
+        return self._abstract_terms
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "id": self.id,
+            "title": self.title,
+            "sections": [list(section) for section in self.sections],
+            "journal": self.journal,
+            "doi": self.doi,
+            "date": self.date,
+            "url": self.url,
+            "pmid": self.pmid,
+            "authors": self.authors,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Article":
+        return cls(
+            source=data["source"],
+            id=data["id"],
+            title=data.get("title", ""),
+            sections=[tuple(section) for section in data.get("sections", [])],
+            journal=data.get("journal", ""),
+            doi=data.get("doi", ""),
+            date=data.get("date", ""),
+            url=data.get("url", ""),
+            pmid=data.get("pmid", ""),
+            authors=data.get("authors", ""),
+        )
+
+
+def split_abstract(abstract: Optional[str]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Turn a plain-text abstract into a single unlabeled section.
+    """
+    if not abstract:
+        return ()
+    return (("", abstract.strip()),)
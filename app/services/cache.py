@@ -0,0 +1,287 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.article import Article
+from services.metrics import register_collector
+from config import (
+    CACHE_MAX_ENTRIES,
+    CACHE_DB_PATH,
+    CACHE_DB_MAX_ENTRIES,
+    CACHE_TTL_PUBMED,
+    CACHE_TTL_EUROPE_PMC,
+    CACHE_TTL_CLINICAL_TRIALS,
+    PUBMED_ARTICLE_STORE_SIZE,
+    CONVERSATION_CACHE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SQLITE_MAX_PARAMS = 500  # keys per IN (...) query, below SQLite's variable limit
+
+SOURCE_TTLS = {
+    "pubmed": CACHE_TTL_PUBMED,
+    "europe_pmc": CACHE_TTL_EUROPE_PMC,
+    "clinical_trials": CACHE_TTL_CLINICAL_TRIALS,
+}
+
+
+def _encode(value):
+    # json.dumps hook: Articles are stored as tagged dicts
+    if isinstance(value, Article):
+        data = value.to_dict()
+        data["__article__"] = True
+        return data
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _decode(data: dict):
+    # json.loads hook: rebuild Articles written by _encode
+    if data.pop("__article__", False):
+        return Article.from_dict(data)
+    return data
+
+
+def make_key(source: str, query: str, past_num_days: int, max_results: int) -> str:
+    """
+    Cache key for one upstream query. Case and whitespace in the query are normalized so
+    "Glioblastoma " and "glioblastoma" share an entry.
+    """
+    normalized = " ".join(str(query).lower().split())
+    return f"{source}|{normalized}|{past_num_days}|{max_results}"
+
+
+class MemoryTier:
+    """
+    In-process LRU tier. Entries are (expires_at, value); the least recently used entry
+    is evicted once `max_entries` is reached.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTier:
+    """
+    On-disk tier so cached responses survive restarts. Values are stored as JSON (Articles
+    included) and the table is trimmed to `max_entries` by last access.
+    """
+    def __init__(self, path: str, max_entries: int, table: str = "response_cache"):
+        self.max_entries = max_entries
+        self.table = table
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[float, Any]]:
+        """
+        Entries for the keys that are stored and unexpired, as {key: (expires_at, value)}.
+        One SELECT per SQLITE_MAX_PARAMS keys and a single commit for the whole lookup.
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found, expired = {}, []
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+                chunk = keys[start:start + SQLITE_MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM {self.table} "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if expires_at < now:
+                        expired.append((key,))
+                    else:
+                        found[key] = (expires_at, value)
+            if not found and not expired:
+                return {}
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", expired)
+            self._conn.executemany(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", [(now, key) for key in found]
+            )
+            self._conn.commit()
+        return {key: (expires_at, json.loads(value, object_hook=_decode)) for key, (expires_at, value) in found.items()}
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        self.set_many([(key, value, expires_at)])
+
+    def set_many(self, entries: List[Tuple[str, Any, float]]) -> None:
+        """
+        Write (key, value, expires_at) entries in one transaction, trimming the table once.
+        """
+        now = time.time()
+        rows = [(key, json.dumps(value, default=_encode), expires_at, now) for key, value, expires_at in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                overflow = count - self.max_entries
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Two-tier TTL cache for upstream responses: the memory tier is checked first, then the
+    optional disk tier (a disk hit is promoted back into memory).
+    """
+    def __init__(self, memory: MemoryTier, disk: Optional[SQLiteTier] = None):
+        self.memory = memory
+        self.disk = disk
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._count("memory_hits")
+            return entry[1]
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self._count("disk_hits")
+                self.memory.set(key, entry[1], entry[0])
+                return entry[1]
+        self._count("misses")
+        return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up several keys at once, returning only the ones that were found. Keys missing
+        from memory are read from disk in one batch.
+        """
+        found, missing = {}, []
+        for key in keys:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self._count("memory_hits")
+                found[key] = entry[1]
+            else:
+                missing.append(key)
+        if missing and self.disk is not None:
+            try:
+                entries = self.disk.get_many(missing)
+            except Exception as e:
+                logger.error("Error reading response cache from disk: %s", e, exc_info=True)
+                entries = {}
+            for key, (expires_at, value) in entries.items():
+                self._count("disk_hits")
+                self.memory.set(key, value, expires_at)
+                found[key] = value
+        for key in missing:
+            if key not in found:
+                self._count("misses")
+        return found
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: Dict[str, Any], ttl: int) -> None:
+        """
+        Store several values with the same ttl; the disk tier writes them in one transaction.
+        """
+        if ttl <= 0 or not items:
+            return
+        expires_at = time.time() + ttl
+        for key, value in items.items():
+            self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            try:
+                self.disk.set_many([(key, value, expires_at) for key, value in items.items()])
+            except Exception as e:
+                logger.error("Error writing response cache to disk: %s", e, exc_info=True)
+        with self._lock:
+            self._stats["sets"] += len(items)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_evictions"] = self.memory.evictions
+        if self.disk is not None:
+            stats["disk_entries"] = len(self.disk)
+            stats["disk_evictions"] = self.disk.evictions
+        return stats
+
+
+def _build_disk_tier(table: str = "response_cache",
+                     max_entries: int = CACHE_DB_MAX_ENTRIES) -> Optional[SQLiteTier]:
+    if not CACHE_DB_PATH:
+        return None
+    try:
+        return SQLiteTier(CACHE_DB_PATH, max_entries, table=table)
+    except sqlite3.Error as e:
+        logger.error("Could not open response cache at %s, using memory only: %s", CACHE_DB_PATH, e)
+        return None
+
+
+response_cache = ResponseCache(MemoryTier(CACHE_MAX_ENTRIES), _build_disk_tier())
+
+# parsed PubMed records keyed by PMID, shares the cache database under its own table
+article_store = ResponseCache(MemoryTier(PUBMED_ARTICLE_STORE_SIZE),
+                             _build_disk_tier("pubmed_articles", PUBMED_ARTICLE_STORE_SIZE))
+
+# literature fetched for a conversation, so follow-up questions can reuse it (memory only)
+conversation_cache = ResponseCache(MemoryTier(CONVERSATION_CACHE_SIZE))
+
+register_collector("response_cache", response_cache.get_stats)
+register_collector("article_store", article_store.get_stats)
+register_collector("conversation_cache", conversation_cache.get_stats)
@@ -0,0 +1,108 @@
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from services.metrics import timer, register_collector
+from config import CLIENT_RETRY_INTERVAL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class LazyClient:
+    """
+    An external client (and its SDK import) created on first use instead of at import time.
+    `factory` builds the client and may check it works, e.g. that a token is accepted; a
+    failed build is remembered for CLIENT_RETRY_INTERVAL seconds so callers fail fast
+    instead of retrying a dead service on every request. `enabled` says whether the current
+    configuration uses this client at all.
+    """
+    def __init__(self, name: str, factory: Callable[[], Any], enabled: Callable[[], bool] = lambda: True):
+        self.name = name
+        self.factory = factory
+        self.enabled = enabled
+        self._client = None
+        self._error: Optional[str] = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            if self._error is not None and time.time() - self._failed_at < CLIENT_RETRY_INTERVAL:
+                raise RuntimeError(f"{self.name} is unavailable: {self._error}")
+            try:
+                with timer(f"init:{self.name}"):
+                    client = self.factory()
+            except Exception as e:
+                self._error, self._failed_at = str(e) or type(e).__name__, time.time()
+                logger.error("Error initializing %s: %s", self.name, e, exc_info=True)
+                raise RuntimeError(f"{self.name} is unavailable: {self._error}") from e
+            logger.info("%s client initialized.", self.name)
+            self._client, self._error = client, None
+            return client
+
+    def status(self) -> dict:
+        if not self.enabled():
+            return {"status": "disabled"}
+        if self._client is not None:
+            return {"status": "ready"}
+        if self._error is not None:
+            return {"status": "error", "error": self._error}
+        return {"status": "not_initialized"}
+
+    def check(self) -> dict:
+        """
+        Initialize the client if it is enabled and not ready yet, then report its status.
+        """
+        if self.enabled():
+            try:
+                self.get()
+            except RuntimeError:
+                pass
+        return self.status()
+
+
+CLIENTS: Dict[str, LazyClient] = {}
+
+
+def register_client(name: str, factory: Callable[[], Any], enabled: Callable[[], bool] = lambda: True) -> LazyClient:
+    client = CLIENTS[name] = LazyClient(name, factory, enabled)
+    return client
+
+
+def check_clients() -> Dict[str, dict]:
+    return {name: client.check() for name, client in CLIENTS.items()}
+
+
+def client_statuses() -> Dict[str, dict]:
+    # what each client is at right now, without initializing anything
+    return {name: client.status() for name, client in CLIENTS.items()}
+
+
+_warmup: Optional[threading.Thread] = None
+_warmup_lock = threading.Lock()
+
+
+def warm_up_clients() -> None:
+    """
+    Initialize the clients in a background thread, unless a warm-up is already running.
+    """
+    global _warmup
+    with _warmup_lock:
+        if _warmup is not None and _warmup.is_alive():
+            return
+        _warmup = threading.Thread(target=check_clients, name="client-warmup", daemon=True)
+        _warmup.start()
+
+
+def _client_stats() -> dict:
+    statuses = [client.status()["status"] for client in CLIENTS.values()]
+    return {status: statuses.count(status) for status in ("ready", "error", "not_initialized", "disabled")}
+
+
+register_collector("clients", _client_stats)
@@ -0,0 +1,325 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+import logging
+from typing import List, Optional
+
+from schemas import UserQuery
+from services.article import Article
+from services.pubmed import fetch_all_sources
+from services.utils import select_disease_informed_articles, deduplicate_articles
+from services.prompt import build_prompt
+from services.llm import summarize_info
+from services.jobs import job_queue
+from services.notification import combine_summaries
+from services.metrics import timed, request_id_var, register_collector
+from config import (
+    NOTIFICATION_TYPE,
+    WATCHLIST,
+    DIGEST_DB_PATH,
+    DIGEST_INTERVAL,
+    DIGEST_MAX_AGE,
+    DIGEST_LOOKBACK_DAYS,
+    DIGEST_MAX_ARTICLES,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DAY = 24 * 3600
+ARTICLE_SOURCES = ("pubmed", "europe_pmc")
+
+
+def normalize_condition(condition: str) -> str:
+    return " ".join(condition.lower().split())
+
+
+class DigestStore:
+    """
+    Watched conditions and their latest digest in SQLite. A digest keeps the summary, the
+    literature and trial rows behind it, and a high-water mark per article source (the
+    start of the last fetch that source answered), so the next refresh only asks for what
+    was published since.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # the file is opened and its tables set up on first use rather than when the module
+        # is imported. Called with the lock held.
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS watchlist ("
+                "key TEXT PRIMARY KEY, condition TEXT NOT NULL, added_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS digests ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, articles TEXT NOT NULL, trials TEXT NOT NULL, "
+                "marks TEXT NOT NULL, updated_at REAL NOT NULL, checked_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def watch(self, condition: str) -> bool:
+        """
+        Add a condition to the watchlist. Returns False if it was already there.
+        """
+        with self._lock:
+            cursor = self._db().execute(
+                "INSERT OR IGNORE INTO watchlist (key, condition, added_at) VALUES (?, ?, ?)",
+                (normalize_condition(condition), condition.strip(), time.time()),
+            )
+            self._db().commit()
+        return cursor.rowcount > 0
+
+    def unwatch(self, condition: str) -> bool:
+        key = normalize_condition(condition)
+        with self._lock:
+            cursor = self._db().execute("DELETE FROM watchlist WHERE key = ?", (key,))
+            self._db().execute("DELETE FROM digests WHERE key = ?", (key,))
+            self._db().commit()
+        return cursor.rowcount > 0
+
+    def watchlist(self) -> List[dict]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT w.condition, d.updated_at, d.checked_at, d.articles IS NOT NULL FROM watchlist w "
+                "LEFT JOIN digests d ON d.key = w.key ORDER BY w.added_at"
+            ).fetchall()
+        return [
+            {"condition": condition, "updated_at": updated_at, "checked_at": checked_at, "has_digest": bool(has_digest)}
+            for condition, updated_at, checked_at, has_digest in rows
+        ]
+
+    def due(self, interval: int) -> List[str]:
+        """
+        Watched conditions never refreshed or last checked more than `interval` seconds ago.
+        """
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT w.condition FROM watchlist w LEFT JOIN digests d ON d.key = w.key "
+                "WHERE d.checked_at IS NULL OR d.checked_at <= ? ORDER BY d.checked_at IS NOT NULL, d.checked_at",
+                (time.time() - interval,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, condition: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT response, articles, trials, marks, updated_at, checked_at FROM digests WHERE key = ?",
+                (normalize_condition(condition),),
+            ).fetchone()
+        if row is None:
+            return None
+        response, articles, trials, marks, updated_at, checked_at = row
+        return {
+            "response": response,
+            "articles": [Article.from_dict(article) for article in json.loads(articles)],
+            "trials": tuple(json.loads(trials)),
+            "marks": json.loads(marks),
+            "updated_at": updated_at,
+            "checked_at": checked_at,
+        }
+
+    def fresh(self, condition: str, max_age: int = DIGEST_MAX_AGE) -> Optional[dict]:
+        """
+        The digest of a watched condition if it was checked within `max_age` seconds.
+        """
+        digest = self.get(condition)
+        if digest is None or digest["checked_at"] < time.time() - max_age:
+            return None
+        return digest
+
+    def save(self, condition: str, digest: dict) -> None:
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO digests (key, response, articles, trials, marks, updated_at, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    normalize_condition(condition),
+                    digest["response"],
+                    json.dumps([article.to_dict() for article in digest["articles"]]),
+                    json.dumps(list(digest["trials"])),
+                    json.dumps(digest["marks"]),
+                    digest["updated_at"],
+                    digest["checked_at"],
+                ),
+            )
+            self._db().commit()
+
+    def touch(self, condition: str, marks: dict, checked_at: float) -> None:
+        # nothing new since the last refresh: the summary stands, only the marks move on
+        with self._lock:
+            self._db().execute(
+                "UPDATE digests SET marks = ?, checked_at = ? WHERE key = ?",
+                (json.dumps(marks), checked_at, normalize_condition(condition)),
+            )
+            self._db().commit()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            watched = self._db().execute("SELECT COUNT(*) FROM watchlist").fetchone()[0]
+            digests = self._db().execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+        return {"watched": watched, "digests": digests}
+
+
+def _fetch_window(marks: dict, now: float) -> int:
+    # days back to the oldest source mark, plus one so a day boundary never drops anything
+    if not all(source in marks for source in ARTICLE_SOURCES):
+        return DIGEST_LOOKBACK_DAYS
+    oldest = min(marks[source] for source in ARTICLE_SOURCES)
+    return max(1, min(DIGEST_LOOKBACK_DAYS, math.ceil((now - oldest) / DAY) + 1))
+
+
+@timed("digest")
+def refresh_digest(condition: str, store: DigestStore) -> Optional[dict]:
+    """
+    Bring the digest of one watched condition up to date. Only literature newer than the
+    stored high-water marks is fetched and merged into what the digest already holds; the
+    summary is regenerated only when new articles or trials came in. Returns the new digest,
+    or None when nothing changed.
+    """
+    now = time.time()
+    previous = store.get(condition)
+    marks = dict(previous["marks"]) if previous else {}
+    days = _fetch_window(marks, now)
+
+    sources = fetch_all_sources(UserQuery(query=condition), max_results=200, past_num_days=days)
+
+    # a source that came back empty may have failed, its mark stays so the next window covers the gap
+    for source in ARTICLE_SOURCES:
+        if sources[source]:
+            marks[source] = now
+
+    # the stored articles are already unique, whatever deduplication adds after them is new
+    known_articles = previous["articles"] if previous else []
+    merged, _ = deduplicate_articles(known_articles + sources["pubmed"] + sources["europe_pmc"])
+    new_articles = merged[len(known_articles):]
+
+    known_rows, known_drugs = previous["trials"] if previous else ([], [])
+    known_trials = {row[0] for row in known_rows if row}
+    fetched_rows, fetched_drugs = sources["clinical_trials"]
+    new_rows = [row for row in fetched_rows if row and row[0] not in known_trials]
+
+    if previous and not new_articles and not new_rows:
+        logger.info("No new literature for '%s' in the last %d days, keeping its digest.", condition, days)
+        store.touch(condition, marks, now)
+        return None
+
+    # newest first, so the oldest literature is what falls off past DIGEST_MAX_ARTICLES
+    articles = (new_articles + merged[:len(known_articles)])[:DIGEST_MAX_ARTICLES]
+    drugs = [drug for drug in fetched_drugs if drug not in known_drugs] + list(known_drugs)
+    trials = (new_rows + list(known_rows), drugs)
+
+    logger.info("Refreshing digest for '%s': %d new articles, %d new trials.", condition, len(new_articles), len(new_rows))
+    relevant_articles = select_disease_informed_articles(UserQuery(query=condition), articles)
+    system_prompt, user_prompt, _ = build_prompt(relevant_articles, trials)
+    digest = {
+        "response": f"{summarize_info(system_prompt, user_prompt)}",
+        "articles": articles,
+        "trials": trials,
+        "marks": marks,
+        "updated_at": now,
+        "checked_at": now,
+    }
+    store.save(condition, digest)
+    return digest
+
+
+class DigestScheduler:
+    """
+    Background thread that keeps the digest of every watched condition fresh. Conditions
+    are refreshed one at a time once they are DIGEST_INTERVAL seconds old; the summaries
+    that changed in a pass go out together as one notification.
+    """
+    def __init__(self, store: DigestStore, interval: int = DIGEST_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"passes": 0, "refreshed": 0, "unchanged": 0, "failed": 0, "notifications": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def run_once(self) -> int:
+        """
+        Refresh every condition that is due. Returns how many digests changed.
+        """
+        changed = []
+        for condition in self.store.due(self.interval):
+            if self._stop.is_set():
+                break
+            token = request_id_var.set(f"digest:{normalize_condition(condition)}")
+            try:
+                digest = refresh_digest(condition, self.store)
+            except Exception as e:
+                logger.error("Error refreshing digest for '%s': %s", condition, e, exc_info=True)
+                self._count("failed")
+                continue
+            finally:
+                request_id_var.reset(token)
+            if digest is None:
+                self._count("unchanged")
+            else:
+                self._count("refreshed")
+                changed.append((condition, digest["response"]))
+        self._count("passes")
+        if changed:
+            self._notify(changed)
+        return len(changed)
+
+    def _notify(self, changed: list) -> None:
+        notification_type = (NOTIFICATION_TYPE or "").lower()
+        if notification_type not in ("slack", "gmail"):
+            return
+        message = combine_summaries(f"Digest updates for {len(changed)} watched condition(s)", changed)
+        job_queue.enqueue("notify", {"notification_type": notification_type, "message": message})
+        self._count("notifications")
+
+    def wake(self) -> None:
+        # a newly watched condition is warmed up right away instead of at the next pass
+        self._wake.set()
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(timeout=min(self.interval, 60)) # due conditions are re-checked at least every minute
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        for condition in WATCHLIST:
+            self.store.watch(condition)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._work, name="digest-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Digest scheduler started, refreshing every %ds.", self.interval)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(self.store.get_stats())
+        return stats
+
+
+digest_store = DigestStore(DIGEST_DB_PATH)
+digest_scheduler = DigestScheduler(digest_store)
+register_collector("digests", digest_scheduler.get_stats)
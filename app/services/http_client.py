@@ -0,0 +1,235 @@
+import random
+import threading
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.metrics import payload_size, upstream_errors, register_collector
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_MAX_BACKOFF,
+    HTTP_POOL_SIZE,
+    NCBI_RATE_LIMIT,
+    EUROPE_PMC_RATE_LIMIT,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# requests/second allowed per upstream host, hosts not listed here are not throttled
+HOST_RATE_LIMITS = {
+    "eutils.ncbi.nlm.nih.gov": NCBI_RATE_LIMIT,
+    "www.ebi.ac.uk": EUROPE_PMC_RATE_LIMIT,
+}
+
+
+class TokenBucket:
+    """
+    Simple thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take one token, sleeping until one is available. Returns the seconds spent waiting,
+        or None without taking a token when none frees up within `max_wait` seconds.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            if max_wait is not None and waited + delay > max_wait:
+                return None
+            time.sleep(delay)
+            waited += delay
+
+
+# monotonic time by which the calls made in the current context must be done, see deadline()
+_deadline: contextvars.ContextVar = contextvars.ContextVar("http_deadline", default=None)
+
+_session = None
+_session_lock = threading.Lock()
+_buckets = {host: TokenBucket(rate) for host, rate in HOST_RATE_LIMITS.items()}
+
+_stats = {
+    "requests": 0,
+    "retries": 0,
+    "failures": 0,
+    "throttled_waits": 0,
+    "throttled_seconds": 0.0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, amount=1) -> None:
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide session, created on first use. The pooled adapter keeps
+    connections alive between calls so we skip the TCP/TLS handshake per request.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Every get() inside this block gives up once `seconds` have passed: attempts are cut
+    short, no retry is started or waited for past it. Nested blocks keep the earlier end.
+    """
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """
+    Seconds until the current deadline, None when there is none.
+    """
+    end = _deadline.get()
+    return None if end is None else end - time.monotonic()
+
+
+def _bounded(timeout, left: Optional[float]):
+    # a single attempt may not outlast the deadline either
+    if left is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(min(part, left) for part in timeout)
+    return min(timeout, left)
+
+
+def _backoff_delay(attempt: int, response: Optional[requests.Response]) -> float:
+    # honour Retry-After when the server tells us how long to wait, up to HTTP_MAX_BACKOFF
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_MAX_BACKOFF)
+    return min(HTTP_BACKOFF_FACTOR * (2 ** attempt) + random.uniform(0, HTTP_BACKOFF_FACTOR), HTTP_MAX_BACKOFF)
+
+
+def _can_wait(delay: float) -> bool:
+    left = time_left()
+    return left is None or delay < left
+
+
+def _throttle(url: str, max_wait: Optional[float]) -> bool:
+    # False when the host's rate limit would hold the call past `max_wait` seconds
+    bucket = _buckets.get(urlparse(url).hostname)
+    if bucket is None:
+        return True
+    waited = bucket.acquire(max_wait)
+    if waited is None:
+        return False
+    if waited > 0:
+        _count("throttled_waits")
+        _count("throttled_seconds", waited)
+    return True
+
+
+def _deadline_passed(host: str, url: str) -> requests.exceptions.Timeout:
+    _count("failures")
+    upstream_errors.inc(upstream=host, reason="deadline")
+    return requests.exceptions.Timeout(f"deadline passed before GET {url}")
+
+
+def _finish(host: str, response: requests.Response, stream: bool) -> requests.Response:
+    if response.status_code >= 400:
+        _count("failures")
+        upstream_errors.inc(upstream=host, reason=str(response.status_code))
+    size = response.headers.get("Content-Length")
+    if size is None and not stream:
+        size = len(response.content)
+    if size is not None:
+        payload_size.observe(int(size), stage=f"http:{host}")
+    return response
+
+
+def get(url: str, params: Optional[dict] = None, timeout=None, **kwargs) -> requests.Response:
+    """
+    GET through the shared session with per-host rate limiting and exponential backoff on
+    429/5xx and connection errors. The last response is returned once retries run out, or
+    when the next wait would pass the caller's deadline, so callers keep handling status
+    codes themselves; network errors are re-raised, and a passed deadline raises Timeout.
+    """
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    session = get_session()
+    host = urlparse(url).hostname
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        left = time_left()
+        if left is not None and left <= 0:
+            raise _deadline_passed(host, url)
+        if not _throttle(url, left):
+            raise _deadline_passed(host, url)
+        left = time_left() # the rate limit may have made us wait
+        if left is not None and left <= 0:
+            raise _deadline_passed(host, url)
+        _count("requests")
+        try:
+            response = session.get(url, params=params, timeout=_bounded(timeout, left), **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            delay = _backoff_delay(attempt, None)
+            if attempt == HTTP_MAX_RETRIES or not _can_wait(delay):
+                _count("failures")
+                upstream_errors.inc(upstream=host, reason=type(e).__name__)
+                raise
+            logger.warning("GET %s failed with %s, retrying (attempt %d).", url, e, attempt + 1)
+        else:
+            delay = _backoff_delay(attempt, response)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == HTTP_MAX_RETRIES or not _can_wait(delay):
+                return _finish(host, response, kwargs.get("stream"))
+            logger.warning("GET %s returned %d, retrying (attempt %d).", url, response.status_code, attempt + 1)
+            response.close() # hand the connection back to the pool, matters for streamed responses
+
+        _count("retries")
+        time.sleep(delay)
+
+
+def get_stats() -> dict:
+    """
+    Snapshot of the client counters (requests, retries, failures, throttled waits).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+register_collector("http_client", get_stats)
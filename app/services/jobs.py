@@ -0,0 +1,188 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from typing import Callable, Dict, List
+
+from services.metrics import timer, register_collector, request_id_var
+from config import (
+    JOB_DB_PATH,
+    JOB_WORKERS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF,
+    JOB_LEASE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# job kind -> function taking the job payload, registered with @register_job
+HANDLERS: Dict[str, Callable[[dict], None]] = {}
+
+
+def register_job(kind: str):
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    """
+    Durable work queue backed by a SQLite table. Jobs survive restarts, failed jobs are
+    retried with exponential backoff, and after JOB_MAX_ATTEMPTS they are kept with status
+    'dead' (the dead-letter set) instead of being retried again. Several processes may
+    share the table: a job is claimed by exactly one of them, and a running job is only
+    handed out again once its claim is older than JOB_LEASE_TIMEOUT (its worker died).
+    """
+    def __init__(self, path: str, workers: int = JOB_WORKERS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _db(self) -> sqlite3.Connection:
+        # the file is opened and its table set up on first use rather than when the module
+        # is imported. Called with the lock held.
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                "run_after REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "claimed_at" not in columns:  # tables created before claims were leased
+                conn.execute("ALTER TABLE jobs ADD COLUMN claimed_at REAL")
+            if "request_id" not in columns:  # tables created before jobs carried the request ID
+                conn.execute("ALTER TABLE jobs ADD COLUMN request_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, run_after)")
+            self._conn = conn
+            self._requeue_abandoned()
+            conn.commit()
+        return self._conn
+
+    def _requeue_abandoned(self) -> None:
+        # jobs whose worker died mid-run get another go; jobs another process is still
+        # running keep their claim. Called with the lock held, the caller commits.
+        self._db().execute(
+            "UPDATE jobs SET status = 'pending' WHERE status = 'running' AND (claimed_at IS NULL OR claimed_at < ?)",
+            (time.time() - JOB_LEASE_TIMEOUT,),
+        )
+
+    def enqueue(self, kind: str, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            # the job logs under the ID of the request that queued it
+            cursor = self._db().execute(
+                "INSERT INTO jobs (kind, payload, run_after, created_at, request_id) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), now, now, request_id_var.get()),
+            )
+            self._db().commit()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def _claim(self):
+        with self._lock:
+            self._requeue_abandoned()
+            while True:
+                now = time.time()
+                row = self._db().execute(
+                    "SELECT id, kind, payload, attempts, request_id FROM jobs "
+                    "WHERE status = 'pending' AND run_after <= ? ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    break
+                # only one process wins the row, a loser moves on to the next pending job
+                cursor = self._db().execute(
+                    "UPDATE jobs SET status = 'running', claimed_at = ? WHERE id = ? AND status = 'pending'",
+                    (now, row[0]),
+                )
+                if cursor.rowcount == 1:
+                    break
+            self._db().commit()
+            return row
+
+    def _complete(self, job_id: int) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._db().commit()
+
+    def _fail(self, job_id: int, attempts: int, error: str) -> None:
+        with self._lock:
+            if attempts >= self.max_attempts:
+                self._db().execute(
+                    "UPDATE jobs SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, job_id),
+                )
+            else:
+                self._db().execute(
+                    "UPDATE jobs SET status = 'pending', attempts = ?, last_error = ?, run_after = ? WHERE id = ?",
+                    (attempts, error, time.time() + JOB_RETRY_BACKOFF * (2 ** (attempts - 1)), job_id),
+                )
+            self._db().commit()
+
+    def run_once(self) -> bool:
+        """
+        Run the next due job, if any. Returns False when there was nothing to do.
+        """
+        row = self._claim()
+        if row is None:
+            return False
+        job_id, kind, payload, attempts, request_id = row
+        handler = HANDLERS.get(kind)
+        token = request_id_var.set(request_id or f"job:{job_id}")
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{kind}'")
+            with timer(f"job:{kind}"):
+                handler(json.loads(payload))
+            self._complete(job_id)
+        except Exception as e:
+            attempts += 1
+            logger.error("Job %d (%s) failed on attempt %d: %s", job_id, kind, attempts, e, exc_info=True)
+            self._fail(job_id, attempts, str(e))
+            if attempts >= self.max_attempts:
+                logger.error("Job %d (%s) moved to the dead-letter set.", job_id, kind)
+        finally:
+            request_id_var.reset(token)
+        return True
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._wake.wait(timeout=1.0) # also wakes up for retries whose backoff has passed
+                self._wake.clear()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %d job workers.", self.workers)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            rows = self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+job_queue = JobQueue(JOB_DB_PATH)
+register_collector("jobs", job_queue.get_stats)
@@ -1,13 +1,22 @@
-import openai
 import logging
+from typing import Iterator
 from config import OPENAI_API_KEY, OPENAI_MODEL
+from services.metrics import timed
+from services.clients import register_client
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# define API key
-openai.api_key = OPENAI_API_KEY
+def _create_openai():
+    import openai # the SDK is slow to import, so only when first needed
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY is not set in the environment.")
+    openai.api_key = OPENAI_API_KEY # define API key
+    return openai
 
+openai_client = register_client("openai", _create_openai)
+
+@timed("llm")
 def summarize_info(system_prompt: str, 
                    user_prompt: str) -> str:
     """
@@ -19,7 +28,7 @@ def summarize_info(system_prompt: str,
         {"role": "user", "content": user_prompt}
     ]
     
-    response = openai.ChatCompletion.create( 
+    response = openai_client.get().ChatCompletion.create( 
         model=OPENAI_MODEL,
         messages=messages,
         temperature=0.7,
@@ -28,3 +37,27 @@ def summarize_info(system_prompt: str,
     
     final_text = response.choices[0].message["content"].strip() # generated text
     return final_text
+
+@timed("llm_stream")
+def stream_summary(system_prompt: str,
+                   user_prompt: str) -> Iterator[str]:
+    """
+    Same request as summarize_info but streamed, yielding pieces of text as the model produces them.
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    response = openai_client.get().ChatCompletion.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=600,
+        stream=True,
+    )
+
+    for chunk in response:
+        content = chunk.choices[0].delta.get("content")
+        if content:
+            yield content
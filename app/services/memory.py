@@ -1,66 +1,221 @@
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
 from uuid import uuid4
-from pinecone import Pinecone, ServerlessSpec
-import openai
+from services.metrics import timed, timer, payload_size, register_collector
+from services.vector_store import VectorStore, PineconeStore, LocalVectorStore
+from services.clients import register_client
+from services.llm import openai_client
 import logging
 
 from config import (
     PINECONE_API_KEY,
     PINECONE_ENV,
     PINECONE_INDEX_NAME,
-    EMBEDDING_DIMENSION
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_WINDOW,
+    EMBEDDING_MAX_BATCH,
+    EMBEDDING_CACHE_SIZE,
+    VECTOR_BACKEND,
+    LOCAL_VECTOR_DIR,
 )
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Lazy-load the embedding model
-_index = None
 
-def get_embedding(text: str) -> list:
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent callers into one multi-input API call.
+    One caller at a time leads: it waits until the oldest queued text is `window` seconds
+    old, sends everything queued so far (up to `max_batch` texts per call) and hands each
+    caller its vectors. A leader stops once its own texts are embedded and the next waiting
+    caller takes over, so no request keeps working for others. Results are kept in an LRU
+    cache keyed by the SHA-256 of the text.
+    """
+    def __init__(self,
+                 window: float = EMBEDDING_BATCH_WINDOW,
+                 max_batch: int = EMBEDDING_MAX_BATCH,
+                 cache_size: int = EMBEDDING_CACHE_SIZE):
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = OrderedDict()  # text hash -> (text, Future, queued_at)
+        self._flushing = False
+        self._lock = threading.Lock()
+        self._turn = threading.Condition(self._lock)  # signalled when vectors arrive or the lead is free
+        self._stats = {"requests": 0, "cache_hits": 0, "cache_misses": 0, "api_calls": 0, "embedded_texts": 0}
 
-    response = openai.Embedding.create(
-        input=[text],
-        model="text-embedding-ada-002"
-    )
-    embedding = response["data"][0]["embedding"]
-    return embedding
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @timed("embedding")
+    def _call_api(self, texts: List[str]) -> List[list]:
+        payload_size.observe(len(texts), stage="embedding_batch")
+        response = openai_client.get().Embedding.create(input=texts, model=EMBEDDING_MODEL)
+        # the API returns one item per input, tagged with its position
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    def _flush_batch(self) -> None:
+        with self._lock:
+            queued_at = next(iter(self._pending.values()))[2]
+        time.sleep(max(0.0, queued_at + self.window - time.monotonic()))  # let other callers join this batch
+        with self._lock:
+            keys = list(self._pending)[:self.max_batch]
+            batch = [self._pending.pop(key) for key in keys]
+        try:
+            vectors = self._call_api([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self._stats["api_calls"] += 1
+            self._stats["embedded_texts"] += len(batch)
+            for key, vector in zip(keys, vectors):
+                self._cache[key] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def _lead(self, own: List[Future]) -> None:
+        # flush in arrival order until this caller's own texts are done, then step down
+        try:
+            while not all(future.done() for future in own):
+                self._flush_batch()
+                with self._lock:
+                    self._turn.notify_all()
+        finally:
+            with self._lock:
+                self._flushing = False
+                self._turn.notify_all()
+
+    def embed_many(self, texts: List[str]) -> List[list]:
+        keys = [self._key(text) for text in texts]
+        results = {}
+        futures = {}
+        with self._lock:
+            self._stats["requests"] += len(texts)
+            for key, text in zip(keys, texts):
+                if key in results or key in futures:
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[key] = self._cache[key]
+                    self._stats["cache_hits"] += 1
+                    continue
+                self._stats["cache_misses"] += 1
+                if key not in self._pending:
+                    self._pending[key] = (text, Future(), time.monotonic())
+                futures[key] = self._pending[key][1]
+
+        own = list(futures.values())
+        while True:
+            with self._lock:
+                while not all(future.done() for future in own) and self._flushing:
+                    self._turn.wait()
+                if all(future.done() for future in own):
+                    break
+                self._flushing = True
+            self._lead(own)
+
+        for key, future in futures.items():
+            results[key] = future.result()
+        return [results[key] for key in keys]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cache_entries"] = len(self._cache)
+        stats["avg_batch_size"] = stats["embedded_texts"] / stats["api_calls"] if stats["api_calls"] else 0.0
+        return stats
+
+
+embedder = EmbeddingBatcher()
+register_collector("embeddings", embedder.get_stats)
+
+def get_embeddings(texts: List[str]) -> List[list]:
+    return embedder.embed_many(texts)
+
+def get_embedding(text: str) -> list:
+    return embedder.embed_many([text])[0]
 
 def init_pinecone():
+    from pinecone import Pinecone, ServerlessSpec # only needed with the pinecone backend
 
-    global _index
-    if _index is None:        
-        logger.info("Initializing Pinecone...")
-        pc = Pinecone(
-            api_key=PINECONE_API_KEY
-        )
+    logger.info("Initializing Pinecone...")
+    pc = Pinecone(
+        api_key=PINECONE_API_KEY
+    )
 
-        if PINECONE_INDEX_NAME not in pc.list_indexes().names():
-            logger.info(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
-            pc.create_index(
-                name=PINECONE_INDEX_NAME, 
-                dimension=EMBEDDING_DIMENSION, 
-                metric='cosine',
-                spec=ServerlessSpec(
-                    cloud='aws',
-                    region=PINECONE_ENV
-                )
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        logger.info(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
+        pc.create_index(
+            name=PINECONE_INDEX_NAME, 
+            dimension=EMBEDDING_DIMENSION, 
+            metric='cosine',
+            spec=ServerlessSpec(
+                cloud='aws',
+                region=PINECONE_ENV
             )
-       
-        _index = pc.Index(PINECONE_INDEX_NAME)
-    return _index
+        )
+   
+    return pc.Index(PINECONE_INDEX_NAME)
+
 
+def _create_vector_store() -> VectorStore:
+    if VECTOR_BACKEND == "local":
+        logger.info(f"Using local vector store in {LOCAL_VECTOR_DIR}")
+        return LocalVectorStore(LOCAL_VECTOR_DIR)
+    return PineconeStore(init_pinecone())
 
-def store_conversation(index, user_query: str, bot_response: str, conversation_id: str):
+vector_store_client = register_client("vector_store", _create_vector_store)
 
-    user_emb = get_embedding(user_query)
-    bot_emb = get_embedding(bot_response)
+def get_vector_store() -> VectorStore:
+    """
+    Conversation memory backend, created on first use according to VECTOR_BACKEND.
+    """
+    return vector_store_client.get()
+
+
+def store_conversation(store: VectorStore, user_query: str, bot_response: str, conversation_id: str):
+
+    user_emb, bot_emb = get_embeddings([user_query, bot_response]) # one API round-trip for both
     
     # to avoide overwriting we use unique IDs (e.g. uuid, timestamps)
     user_id = f"{conversation_id}-user-{uuid4()}"
     bot_id = f"{conversation_id}-assistant-{uuid4()}"
+    created_at = time.time()
+
+    with timer("vector_upsert"):
+        store.upsert([
+            (user_id, user_emb, {"role": "user", "content": user_query, "conversation_id": conversation_id, "created_at": created_at}),
+            (bot_id, bot_emb, {"role": "assistant", "content": bot_response, "conversation_id": conversation_id, "created_at": created_at})
+        ])
+
 
-    index.upsert([
-        (user_id, user_emb, {"role": "user", "content": user_query, "conversation_id": conversation_id}),
-        (bot_id, bot_emb, {"role": "assistant", "content": bot_response, "conversation_id": conversation_id})
-    ])
+def retrieve_context(conversation_id: str, query: str, k: int = 5) -> List[dict]:
+    """
+    The `k` stored turns of this conversation most similar to `query`, best first.
+    """
+    query_emb = get_embedding(query)
+    with timer("vector_query"):
+        matches = get_vector_store().query(query_emb, k, filter={"conversation_id": conversation_id})
+    return [
+        {
+            "role": match["metadata"].get("role"),
+            "content": match["metadata"].get("content", ""),
+            "created_at": match["metadata"].get("created_at"),
+            "score": match["score"],
+        }
+        for match in matches
+    ]
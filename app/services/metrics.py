@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# request ID of the request being served, carried into log lines by RequestIdFilter
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+SIZE_BUCKETS = (0, 1, 10, 50, 100, 200, 500, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return "\n".join(lines)
+
+
+stage_duration = Histogram("app_stage_duration_seconds", "Time spent in each pipeline stage.")
+stage_errors = Counter("app_stage_errors_total", "Exceptions raised out of each pipeline stage.")
+payload_size = Histogram("app_payload_size", "Size of stage inputs and outputs (bytes or item counts).", SIZE_BUCKETS)
+upstream_errors = Counter("app_upstream_errors_total", "Failed or timed out upstream calls.")
+http_requests = Counter("app_http_requests_total", "HTTP requests served, by route template and status code.")
+
+_METRICS = [stage_duration, stage_errors, payload_size, upstream_errors, http_requests]
+
+# name -> function returning a flat dict of numbers, read at scrape time (cache stats etc.)
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_collector(component: str, collect: Callable[[], dict]) -> None:
+    _collectors[component] = collect
+
+
+@contextmanager
+def timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        stage_duration.observe(time.perf_counter() - started, stage=stage)
+
+
+def timed(stage: str):
+    """
+    Decorator recording the duration of every call under `stage` (and errors raised).
+    For generator functions the whole iteration is timed, and the wait for the first
+    item is recorded separately as `<stage>_first_item`.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with timer(stage):
+                    started = time.perf_counter()
+                    first = True
+                    for item in func(*args, **kwargs):
+                        if first:
+                            stage_duration.observe(time.perf_counter() - started, stage=f"{stage}_first_item")
+                            first = False
+                        yield item
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _render_collectors() -> str:
+    name = "app_component_stat"
+    lines = [f"# HELP {name} Counters reported by caches, queues and clients.", f"# TYPE {name} gauge"]
+    for component, collect in sorted(_collectors.items()):
+        try:
+            stats = collect()
+        except Exception as e:
+            logger.error("Error collecting %s stats: %s", component, e)
+            continue
+        for stat, value in sorted(stats.items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"{name}{_format_labels(_label_key({'component': component, 'stat': stat}))} {value}")
+    return "\n".join(lines)
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    return "\n".join([metric.render() for metric in _METRICS] + [_render_collectors()]) + "\n"
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds `request_id` to every log record so handlers can put it in their format.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
@@ -1,50 +1,76 @@
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
 import base64
+import threading
 import logging
 from email.mime.text import MIMEText
+from typing import List, Tuple
 
+from services.metrics import timed
+from services.clients import register_client
 from config import (
+    NOTIFICATION_TYPE,
     SLACK_BOT_TOKEN,
     SLACK_USER_ID,
+    SLACK_API_URL,
     GMAIL_CREDENTIALS_JSON
 )
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-def send_slack_dm(message: str) -> None:
-    slack_bot_token = SLACK_BOT_TOKEN
-    slack_user_id = SLACK_USER_ID  # This is the Slack user ID to receive the DM
+def _create_slack_client():
+    from slack_sdk import WebClient # the notification SDKs are only imported when used
+
+    client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL)
+    client.auth_test() # fails right away on a missing or revoked token
+    return client
+
+def _create_gmail_service():
+    from googleapiclient.discovery import build
+    from google.oauth2.credentials import Credentials
+
+    if not GMAIL_CREDENTIALS_JSON:
+        raise RuntimeError("GMAIL_CREDENTIALS_JSON is not set in the environment.")
+    # load credentials from the JSON file, they refresh themselves when the token expires
+    creds = Credentials.from_authorized_user_file(
+        GMAIL_CREDENTIALS_JSON,
+        scopes=["https://www.googleapis.com/auth/gmail.compose"]
+    )
+    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+
+slack_client = register_client("slack", _create_slack_client, lambda: (NOTIFICATION_TYPE or "").lower() == "slack")
+gmail_client = register_client("gmail", _create_gmail_service, lambda: (NOTIFICATION_TYPE or "").lower() == "gmail")
+_gmail_lock = threading.Lock() # the service's httplib2 connection must not be shared by two threads at once
+
+@timed("slack")
+def send_slack_dm(message: str) -> bool:
+    from slack_sdk.errors import SlackApiError
 
-    client = WebClient(token=slack_bot_token)
+    slack_user_id = SLACK_USER_ID  # This is the Slack user ID to receive the DM
     try:
-        
+        client = slack_client.get()
+
         response = client.conversations_open(users=[slack_user_id]) # open a conversation with the user
         channel_id = response["channel"]["id"]
         
         client.chat_postMessage(channel=channel_id, text=message) # send the DM
         logger.info("Slack DM sent successfully.")
+        return True
     except SlackApiError as e:
         logger.error(f"Error sending Slack DM: {e.response['error']}")
+        return False
+    except RuntimeError as e:
+        logger.error(f"Error sending Slack DM: {e}")
+        return False
 
-def create_gmail_draft(message: str, subject: str = "Drug Development Summary", to: str = None) -> None:
+@timed("gmail")
+def create_gmail_draft(message: str, subject: str = "Drug Development Summary", to: str = None) -> bool:
 
-    gmail_credentials_json = GMAIL_CREDENTIALS_JSON
-
-    if not gmail_credentials_json:
+    if not GMAIL_CREDENTIALS_JSON:
         logger.error("GMAIL_CREDENTIALS_JSON is not set in the environment.")
-        return
+        return False
 
     try:
-        # load credentials from the JSON file
-        creds = Credentials.from_authorized_user_file(
-            gmail_credentials_json,
-            scopes=["https://www.googleapis.com/auth/gmail.compose"]
-        )
-        service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+        service = gmail_client.get() # built once and reused
 
         # create a MIMEText email message
         message_obj = MIMEText(message)
@@ -53,7 +79,17 @@ def create_gmail_draft(message: str, subject: str = "Drug Development Summary",
         raw_message = base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
 
         draft = {"message": {"raw": raw_message}} 
-        draft_response = service.users().drafts().create(userId="me", body=draft).execute() # make the draft message
-        logger.info("Gmail draft created successfully.")    
+        with _gmail_lock:
+            draft_response = service.users().drafts().create(userId="me", body=draft).execute() # make the draft message
+        logger.info("Gmail draft created successfully.")
+        return True
     except Exception as e:
         logger.error(f"Error creating Gmail draft: {e}")
+        return False
+
+def combine_summaries(heading: str, summaries: List[Tuple[str, str]]) -> str:
+    """
+    One message holding several (title, summary) pairs, for notifications sent in bulk.
+    """
+    sections = [f"*{title}*\n{summary}" for title, summary in summaries]
+    return f"{heading}\n\n" + "\n\n".join(sections)
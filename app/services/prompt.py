@@ -0,0 +1,206 @@
+import logging
+from functools import lru_cache
+from typing import List, Tuple
+
+from services.article import Article
+from services.utils import process_article_for_summary
+from services.metrics import timed
+from config import (
+    OPENAI_MODEL,
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_MAX_ARTICLE_TOKENS,
+    PROMPT_TRIALS_SHARE,
+    CONTEXT_TOKEN_CAP,
+)
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SYSTEM_PROMPT = (
+    "You are a helpful pharmaceutical assistant with in-depth knowledge of new drug development and clinical trials."
+)
+
+USER_PROMPT_TEMPLATE = """{history}
+    Article Headlines: {headlines}
+
+    Article Context and Detail: {articles}
+
+    Clinical Trial News: {trials}
+
+    Newly Trialed Drugs: {drugs}
+
+    Provide a concise summary with two sections:
+
+    Section 1: Drug Development Summary
+    - Summarize the overall news and insights regarding the drug development related to the specified disease.
+
+    Section 2: New Drug Details
+    - List the names of the newest drugs mentioned and briefly describe what each drug does.
+    """
+
+HISTORY_HEADER = "\n    Earlier in this conversation:\n"
+ARTICLE_SEPARATOR = "\n\n---\n\n"
+ELLIPSIS = " ..."  # appended where an item was cut short
+MAX_HEADLINES = 10
+MIN_TRUNCATED_TOKENS = 50  # below this a cut-down item is not worth including
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(OPENAI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # the encoding files are downloaded on first use, which fails offline
+        logger.warning("Could not load tiktoken encoding, estimating token counts instead: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1  # roughly four characters per token for English text
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    # the ellipsis marking the cut counts towards max_tokens as well
+    room = max_tokens - count_tokens(ELLIPSIS)
+    if room <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:room * 4].rstrip() + ELLIPSIS
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:room]).rstrip() + ELLIPSIS
+
+
+def pack_items(items: List[str],
+               budget: int,
+               max_item_tokens: int = 0,
+               separator: str = "\n") -> Tuple[List[str], int]:
+    """
+    Take items in order (highest priority first) until `budget` tokens are used, counting
+    the separator they will be joined with. Each item is capped at `max_item_tokens`
+    (0 means no cap); the item that no longer fits is cut down to the remaining room, and
+    packing stops there.
+    """
+    separator_tokens = count_tokens(separator)
+    packed, used = [], 0
+    for item in items:
+        if max_item_tokens:
+            item = truncate_to_tokens(item, max_item_tokens)
+        tokens = count_tokens(item) + separator_tokens
+        remaining = budget - used
+        if tokens > remaining:
+            if remaining - separator_tokens >= MIN_TRUNCATED_TOKENS:
+                item = truncate_to_tokens(item, remaining - separator_tokens)
+                packed.append(item)
+                used += count_tokens(item) + separator_tokens
+            break
+        packed.append(item)
+        used += tokens
+    return packed, used
+
+
+def _format_trial(row: list) -> str:
+    return " | ".join(str(value) for value in row if value)
+
+
+def _format_drug(drug: dict) -> str:
+    return f"{drug.get('drug_name', '')} (first posted {drug.get('First Posted', 'n/a')})"
+
+
+def _format_turn(turn: dict) -> str:
+    speaker = "User" if turn.get("role") == "user" else "Assistant"
+    return f"{speaker}: {turn.get('content', '')}"
+
+
+@timed("prompt")
+def build_prompt(articles: List[Article],
+                 trials: tuple,
+                 budget: int = PROMPT_TOKEN_BUDGET,
+                 history: List[dict] = ()) -> Tuple[str, str, dict]:
+    """
+    Assemble the system and user prompts within `budget` tokens.
+
+    Priority: the template and system prompt are always kept, then the newly trialed drug
+    names, then headlines, then earlier turns of the conversation (most relevant first,
+    at most CONTEXT_TOKEN_CAP tokens, shown in the order they happened), then the ranked
+    article texts, which get all the room the trial rows (at most PROMPT_TRIALS_SHARE of
+    the budget) do not take.
+    Returns (system_prompt, user_prompt, usage) where usage holds the tokens and item
+    counts per section.
+    """
+    trial_rows, drugs = trials
+    fixed = count_tokens(SYSTEM_PROMPT) + count_tokens(
+        USER_PROMPT_TEMPLATE.format(history="", headlines="", articles="", trials="", drugs="")
+    )
+    remaining = max(0, budget - fixed)
+
+    drug_items, drug_tokens = pack_items([_format_drug(drug) for drug in drugs], remaining)
+    remaining -= drug_tokens
+
+    headlines, headline_tokens = pack_items([article.title for article in articles[:MAX_HEADLINES]], remaining)
+    remaining -= headline_tokens
+
+    # the most relevant turns are packed first, the ones that fit are shown in the order they happened
+    turns = list(history)
+    packed_turns, history_tokens = pack_items(
+        [_format_turn(turn) for turn in turns], min(remaining, CONTEXT_TOKEN_CAP), separator="\n\n"
+    )
+    kept = sorted(zip(turns, packed_turns), key=lambda pair: pair[0].get("created_at") or 0)
+    history_items = [text for _, text in kept]
+    history_text = ""
+    if history_items:
+        history_text = HISTORY_HEADER + "\n\n".join(history_items) + "\n"
+        history_tokens += count_tokens(HISTORY_HEADER)
+    remaining -= history_tokens
+
+    # trials are packed within their cap first so the articles get everything they leave,
+    # and nothing is held back when there are few or no trial rows
+    trial_items, trial_tokens = pack_items(
+        [_format_trial(row) for row in trial_rows], min(remaining, int(budget * PROMPT_TRIALS_SHARE))
+    )
+    remaining -= trial_tokens
+
+    article_items, article_tokens = pack_items(
+        [process_article_for_summary(article) for article in articles],
+        remaining,
+        PROMPT_MAX_ARTICLE_TOKENS,
+        ARTICLE_SEPARATOR,
+    )
+
+    user_prompt = USER_PROMPT_TEMPLATE.format(
+        history=history_text,
+        headlines="\n".join(headlines),
+        articles=ARTICLE_SEPARATOR.join(article_items),
+        trials="\n".join(trial_items),
+        drugs="\n".join(drug_items),
+    )
+
+    usage = {
+        "fixed": fixed,
+        "drugs": drug_tokens,
+        "headlines": headline_tokens,
+        "history": history_tokens,
+        "history_turns": len(history_items),
+        "articles": article_tokens,
+        "articles_included": len(article_items),
+        "articles_available": len(articles),
+        "trials": trial_tokens,
+        "trials_included": len(trial_items),
+        "trials_available": len(trial_rows),
+        "total": count_tokens(SYSTEM_PROMPT) + count_tokens(user_prompt),
+        "budget": budget,
+    }
+    return SYSTEM_PROMPT, user_prompt, usage
@@ -0,0 +1,84 @@
+import math
+import heapq
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from services.article import Article, tokenize
+
+# words that frame a question rather than say what it is about
+QUESTION_WORDS = frozenset(
+    "what about how why when where who whom whose does do did can could would should will any there "
+    "tell me more please other latest recent".split()
+)
+
+
+class BM25Index:
+    """
+    In-memory inverted index over a list of articles, scored with Okapi BM25.
+    Title terms are counted `title_weight` times so a match in the title outranks the
+    same match buried in an abstract. Article terms come from the tokens each Article
+    keeps, so only the query is tokenized per request.
+    """
+    def __init__(self, articles: List[Article], k1: float = 1.5, b: float = 0.75, title_weight: int = 2):
+        self.articles = articles
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+
+        for doc_id, article in enumerate(articles):
+            terms = article.title_terms * title_weight + article.abstract_terms
+            self.doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self.postings[term].append((doc_id, frequency))
+
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def _idf(self, term: str) -> float:
+        n = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.articles) - n + 0.5) / (n + 0.5))
+
+    def score(self, query: str) -> Dict[int, float]:
+        """
+        BM25 score for every document that matches at least one query term.
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for doc_id, frequency in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_length or 1)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[Tuple[Article, float]]:
+        scores = self.score(query)
+        # ties are broken by input order so results are deterministic
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.articles[doc_id], score) for doc_id, score in best]
+
+
+def rank_articles(query: str, articles: List[Article], top_k: int) -> List[Article]:
+    """
+    Return the `top_k` articles most relevant to `query`, best first.
+    """
+    if not articles:
+        return []
+    return [article for article, _ in BM25Index(articles).top_k(query, top_k)]
+
+
+def covers(query: str, articles: List[Article]) -> bool:
+    """
+    Whether every word the query is about (stopwords and question words aside) occurs in
+    at least one of `articles`, i.e. whether these articles can answer it at all.
+    """
+    terms = {term for term in tokenize(query) if term not in QUESTION_WORDS}
+    if not terms:
+        return False
+    vocabulary = set()
+    for article in articles:
+        vocabulary.update(article.title_terms)
+        vocabulary.update(article.abstract_terms)
+    return terms <= vocabulary
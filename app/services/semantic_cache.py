@@ -0,0 +1,121 @@
+import threading
+import time
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+from services.memory import get_embedding
+from services.metrics import timed, register_collector
+from config import (
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class SemanticCache:
+    """
+    Cache of final summaries keyed by query embedding. A lookup returns the stored summary
+    (and the literature it was written from) of the most similar earlier query if its
+    cosine similarity is at least `threshold`.
+    Entries live in fixed slots of one preallocated matrix, so a lookup is a single
+    matrix-vector product; they expire after `ttl` seconds and the least recently used
+    slot is reused once all `max_entries` are taken.
+    """
+    def __init__(self,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: int = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._matrix = None  # (max_entries, dimension), allocated on the first store
+        self._keys = [None] * max_entries
+        self._responses = [None] * max_entries
+        self._literature = [None] * max_entries
+        self._expires_at = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._slots = {}  # normalized query -> slot
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _embed(query: str) -> np.ndarray:
+        vector = np.asarray(get_embedding(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @timed("semantic_cache_lookup")
+    def lookup(self, query: str) -> Optional[Tuple[str, float, str, Optional[dict]]]:
+        """
+        Returns (response, similarity, cached_query, literature) on a hit, None otherwise.
+        """
+        vector = self._embed(query)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if self._matrix is None:
+                self._stats["misses"] += 1
+                return None
+            now = time.time()
+            scores = self._matrix @ vector
+            scores[self._expires_at <= now] = -np.inf  # expired and empty slots never match
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._last_used[best] = now
+            self._stats["hits"] += 1
+            return self._responses[best], similarity, self._keys[best], self._literature[best]
+
+    def _free_slot(self, now: float) -> int:
+        # an empty or expired slot if there is one, otherwise the least recently used
+        available = np.flatnonzero(self._expires_at <= now)
+        slot = int(available[0]) if len(available) else int(np.argmin(self._last_used))
+        if self._keys[slot] is not None:
+            del self._slots[self._keys[slot]]
+            if self._expires_at[slot] > now:
+                self._stats["evictions"] += 1
+        return slot
+
+    def store(self, query: str, response: str, literature: Optional[dict] = None) -> None:
+        vector = self._embed(query)
+        key = self._normalize(query)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            now = time.time()
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._free_slot(now)
+            self._matrix[slot] = vector
+            self._keys[slot] = key
+            self._responses[slot] = response
+            self._literature[slot] = literature
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._slots[key] = slot
+            self._stats["stores"] += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = int((self._expires_at > time.time()).sum())
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
+
+
+semantic_cache = SemanticCache()
+register_collector("semantic_cache", semantic_cache.get_stats)
@@ -0,0 +1,118 @@
+import csv
+import io
+import re
+import logging
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+import requests
+
+from services import http_client
+from services.metrics import timed, payload_size, upstream_errors
+from services.cache import response_cache, make_key, SOURCE_TTLS
+from config import CLINICAL_TRIALS_BASE_URL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# CSV columns requested from the studies endpoint, in the order rows are kept
+FIELDS = ["NCT Number", "Conditions", "Study Title", "Interventions", "First Posted"]
+INTERVENTIONS, FIRST_POSTED = FIELDS.index("Interventions"), FIELDS.index("First Posted")
+MAX_PAGE_SIZE = 1000  # largest page the v2 API serves
+
+# one match per drug in a cell such as "DRUG: Vorasidenib|DEVICE: Optune|DRUG: Temozolomide"
+_DRUG = re.compile(r"(?:^|\|)\s*DRUG:\s*([^|]+)", re.IGNORECASE)
+
+
+def _read_page(text: str) -> List[list]:
+    """
+    Parse one CSV page into rows ordered like FIELDS, whatever order the columns came in.
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if not header:
+        return []
+    positions = [header.index(field) if field in header else None for field in FIELDS]
+    return [
+        [row[position] if position is not None and position < len(row) else "" for position in positions]
+        for row in reader if row
+    ]
+
+
+@timed("clinical_trials")
+def fetch_new_drug_development_trials(condition: str, days: int = 730, max_results: int = 10) -> Tuple[list, list]:
+    """
+    Studies for `condition` that test at least one drug, and the drugs first posted in the
+    last `days` days. Only the FIELDS columns are requested (as CSV), following the page
+    token when more than one page is needed. Returns (rows, drugs_with_date).
+    """
+    cache_key = make_key("clinical_trials", condition, days, max_results)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return tuple(cached)
+    try:
+        endpoint = f"{CLINICAL_TRIALS_BASE_URL}studies"
+        params = {
+            "format": "csv",
+            "markupFormat": "legacy",
+            "query.term": condition,
+            "fields": "|".join(FIELDS),
+            "pageSize": min(max_results, MAX_PAGE_SIZE),
+        }
+
+        rows: List[list] = []
+        while len(rows) < max_results:
+            response = http_client.get(endpoint, params=params)
+            response.raise_for_status()
+            rows.extend(_read_page(response.content.decode("utf-8")))
+            page_token = response.headers.get("x-next-page-token")
+            if not page_token:
+                break
+            params["pageToken"] = page_token
+        rows = rows[:max_results]
+        payload_size.observe(len(rows), stage="clinical_trials_studies")
+
+        fields = [row for row in rows if _DRUG.search(row[INTERVENTIONS])] # only studies testing a drug
+
+        drugs_with_date = process_fields(fields, days)
+        response_cache.set(cache_key, [fields, drugs_with_date], SOURCE_TTLS["clinical_trials"])
+        return fields, drugs_with_date
+    except requests.exceptions.Timeout as te:
+        logger.error("Timeout occurred while fetching clinical trials: %s", te, exc_info=True)
+        upstream_errors.inc(upstream="clinical_trials", reason="timeout")
+        return ([], [])
+    except Exception as e:
+        logger.error("Error fetching new drug development trials: %s", e, exc_info=True)
+        upstream_errors.inc(upstream="clinical_trials", reason="error")
+        return ([], [])
+
+
+def process_fields(fields: List[list], days: int = 730) -> List[dict]:
+    """
+    Drugs from trials first posted within the last `days` days, newest first, one entry per
+    drug name. Works on whole columns: the ISO dates are compared as one NumPy string array
+    (YYYY-MM-DD sorts like the date it spells), and every DRUG: intervention of a row counts.
+    """
+    if not fields:
+        return []
+    today = datetime.today()
+    start = (today - timedelta(days=days)).strftime("%Y-%m-%d")
+
+    posted = np.array([row[FIRST_POSTED] if len(row) > FIRST_POSTED else "" for row in fields], dtype=str)
+    in_window = (posted >= start) & (posted <= today.strftime("%Y-%m-%d"))
+    skipped = int(np.count_nonzero(posted != "")) - int(np.count_nonzero(in_window))
+    if skipped:
+        logger.debug("%d trials posted outside the last %d days (or with an unreadable date).", skipped, days)
+
+    order = np.argsort(posted[in_window], kind="stable")[::-1]  # newest first
+    rows = np.flatnonzero(in_window)[order]
+
+    drugs_with_date, seen = [], set()
+    for row in rows:
+        for name in _DRUG.findall(fields[row][INTERVENTIONS]):
+            name = name.strip()
+            if name and name.lower() not in seen:
+                seen.add(name.lower())
+                drugs_with_date.append({"drug_name": name, "First Posted": str(posted[row])})
+    return drugs_with_date
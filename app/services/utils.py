@@ -1,34 +1,96 @@
-def process_article_for_summary(article):
-    # retrieve the title (if present)
-    title = article.get("title", "")
-    
-    # retrieve the abstract sections (ensure it's a list)
-    abstract_sections = article.get("abstract", [])
-    
-    # format each section with its label and text
-    formatted_sections = []
-    for section in abstract_sections:
-        if isinstance(section, dict):
-            label = section.get('@Label', 'SECTION')
-            text = section.get('#text', '')
-            formatted_sections.append(f"{label}: {text}")
+import re
+from typing import List, Tuple
+
+from services.article import Article
+from services.ranking import rank_articles
+from services.metrics import timed
+from config import RANKING_TOP_K
+
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def _title_fingerprint(article: Article) -> str:
+    # punctuation, case and spacing differ between PubMed and Europe PMC titles
+    return _NON_ALNUM.sub("", article.title_lower)
+
+def _merge_articles(kept: Article, duplicate: Article) -> Article:
+    # keep the record with the richer abstract and fill its gaps from the other one
+    base, other = (kept, duplicate) if len(kept.abstract_text) >= len(duplicate.abstract_text) else (duplicate, kept)
+    return Article(
+        source=base.source,
+        id=base.id,
+        title=base.title or other.title,
+        sections=base.sections or other.sections,
+        journal=base.journal or other.journal,
+        doi=base.doi or other.doi,
+        date=base.date or other.date,
+        url=base.url or other.url,
+        pmid=base.pmid or other.pmid,
+        authors=base.authors or other.authors,
+    )
+
+def _conflicting_ids(first: Article, second: Article) -> bool:
+    # two different PMIDs or DOIs are two different papers, whatever else they share
+    return any(
+        getattr(first, field) and getattr(second, field) and getattr(first, field) != getattr(second, field)
+        for field in ("pmid", "doi")
+    )
+
+@timed("dedup")
+def deduplicate_articles(articles: List[Article]) -> Tuple[List[Article], dict]:
+    """
+    Collapse records of the same paper coming from several sources, matching on PMID,
+    DOI or title fingerprint through hash lookups (linear in the number of articles).
+    Records whose PMIDs or DOIs differ are never merged, whichever key matched.
+    Returns the unique articles in first-seen order and the merge counts per key.
+    """
+    unique: List[Article] = []
+    index = {} # ("pmid" | "doi" | "title", value) -> position in unique
+    stats = {"input": len(articles), "pmid": 0, "doi": 0, "title": 0}
+
+    for article in articles:
+        keys = [("pmid", article.pmid), ("doi", article.doi), ("title", _title_fingerprint(article))]
+        keys = [key for key in keys if key[1]]
+
+        position = None
+        for key in keys:
+            if key in index:
+                if _conflicting_ids(unique[index[key]], article):
+                    continue
+                position = index[key]
+                stats[key[0]] += 1
+                break
+
+        if position is None:
+            position = len(unique)
+            unique.append(article)
         else:
-            # if a section isn't a dict, include it as-is
-            formatted_sections.append(str(section))
-    
+            unique[position] = _merge_articles(unique[position], article)
+            merged = unique[position]
+            keys = [("pmid", merged.pmid), ("doi", merged.doi), ("title", _title_fingerprint(merged))]
+
+        for key in keys:
+            if key[1]:
+                index.setdefault(key, position)
+
+    stats["output"] = len(unique)
+    return unique, stats
+
+def process_article_for_summary(article: Article):
+    # format each abstract section with its label and text
+    formatted_sections = [
+        f"{label}: {text}" if label else text
+        for label, text in article.sections
+    ]
+
     # combine title and abstract sections into one string
-    combined_text = f"Title: {title}\n\nAbstract:\n" + "\n\n".join(formatted_sections)
+    combined_text = f"Title: {article.title}\n\nAbstract:\n" + "\n\n".join(formatted_sections)
     return combined_text
 
-def select_disease_informed_articles(user_input: str, news_data_pubmed:list):
-
-    relevant_articles = []
-    for article_sections in news_data_pubmed:  # assuming each article is a list of sections
-        # Join all '#text' values from the sections into one summary string.
-        full_text = " ".join(
-            section.get("#text", "") if isinstance(section, dict) else section
-            for section in article_sections['abstract']
-        ).lower()
-        if user_input.query.lower() in full_text and user_input.query.lower() in article_sections['title']:
-            relevant_articles.append(article_sections)
-    return relevant_articles
\ No newline at end of file
+@timed("ranking")
+def select_disease_informed_articles(user_input: str, articles: list, top_k: int = RANKING_TOP_K):
+    """
+    Rank the merged PubMed and Europe PMC articles against the query with BM25 and keep
+    the best `top_k`.
+    """
+    return rank_articles(user_input.query, articles, top_k)
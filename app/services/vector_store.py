@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    EMBEDDING_DIMENSION,
+    LOCAL_ANN_THRESHOLD,
+)
+
+try:
+    import hnswlib
+except ImportError:  # exact search only
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# (id, vector, metadata)
+Record = Tuple[str, List[float], dict]
+
+
+class VectorStore:
+    """
+    Minimal interface the conversation memory needs from a vector database.
+    """
+    def upsert(self, records: List[Record]) -> None:
+        raise NotImplementedError
+
+    def query(self, vector: List[float], k: int, filter: Optional[dict] = None) -> List[dict]:
+        """
+        Return up to `k` matches as {"id", "score", "metadata"} dicts, best first.
+        `filter` keeps only records whose metadata equals every given key/value.
+        """
+        raise NotImplementedError
+
+
+class PineconeStore(VectorStore):
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, records: List[Record]) -> None:
+        self.index.upsert(records)
+
+    def query(self, vector: List[float], k: int, filter: Optional[dict] = None) -> List[dict]:
+        pinecone_filter = {key: {"$eq": value} for key, value in (filter or {}).items()}
+        response = self.index.query(vector=vector, top_k=k, filter=pinecone_filter or None, include_metadata=True)
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": match.get("metadata") or {}}
+            for match in response["matches"]
+        ]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vectors in a memory-mapped float32 matrix on disk, metadata in a JSON-lines file next
+    to it. Vectors are L2-normalized on insert so cosine similarity is a single matrix-vector
+    product. Filtered queries only touch the matching rows; once the candidate set reaches
+    LOCAL_ANN_THRESHOLD rows and hnswlib is installed, an HNSW index is used instead.
+    """
+    def __init__(self, directory: str, dimension: int = EMBEDDING_DIMENSION, ann_threshold: int = LOCAL_ANN_THRESHOLD):
+        os.makedirs(directory, exist_ok=True)
+        self.dimension = dimension
+        self.ann_threshold = ann_threshold
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._metadata_path = os.path.join(directory, "metadata.jsonl")
+        self._lock = threading.Lock()
+
+        self.ids: List[str] = []
+        self.metadata: List[dict] = []
+        self._rows_by_id: Dict[str, int] = {}
+        self._rows_by_value: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        if os.path.exists(self._metadata_path):
+            with open(self._metadata_path, encoding="utf-8") as file:
+                for line in file:
+                    entry = json.loads(line)
+                    self._index_row(entry["row"], entry["id"], entry["metadata"])
+
+        capacity = max(1024, len(self.ids))
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (4 * dimension))
+        self._open(capacity)
+        self._ann = None
+
+    def _open(self, capacity: int) -> None:
+        size = capacity * self.dimension * 4
+        with open(self._vectors_path, "ab") as file:
+            if file.tell() < size:
+                file.truncate(size)
+        self.capacity = capacity
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _index_row(self, row: int, id: str, metadata: dict) -> None:
+        if row == len(self.ids):
+            self.ids.append(id)
+            self.metadata.append(metadata)
+        else:
+            # an upsert of an existing id, the last line written for a row wins
+            for key, value in self.metadata[row].items():
+                rows = self._rows_by_value.get((key, str(value)))
+                if rows and row in rows:
+                    rows.remove(row)
+            self.metadata[row] = metadata
+        self._rows_by_id[id] = row
+        for key, value in metadata.items():
+            self._rows_by_value[(key, str(value))].append(row)
+
+    def upsert(self, records: List[Record]) -> None:
+        with self._lock:
+            lines = []
+            for id, vector, metadata in records:
+                row = self._rows_by_id.get(id, len(self.ids))
+                if row >= self.capacity:
+                    self._matrix.flush()
+                    del self._matrix
+                    self._open(self.capacity * 2)
+                vector = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                self._matrix[row] = vector / norm if norm else vector
+                self._index_row(row, id, metadata)
+                lines.append(json.dumps({"row": row, "id": id, "metadata": metadata}))
+                if self._ann is not None:
+                    if row >= self._ann.get_max_elements():
+                        self._ann.resize_index(self.capacity)
+                    self._ann.add_items(self._matrix[row:row + 1], [row])
+            self._matrix.flush()
+            with open(self._metadata_path, "a", encoding="utf-8") as file:
+                file.write("".join(line + "\n" for line in lines))
+
+    def _candidate_rows(self, filter: Optional[dict]) -> Optional[List[int]]:
+        if not filter:
+            return None  # every row
+        rows = None
+        for key, value in filter.items():
+            matching = set(self._rows_by_value.get((key, str(value)), ()))
+            rows = matching if rows is None else rows & matching
+        return sorted(rows)
+
+    def _ann_index(self):
+        if self._ann is None:
+            logger.info("Building HNSW index over %d vectors.", len(self.ids))
+            index = hnswlib.Index(space="ip", dim=self.dimension)
+            index.init_index(max_elements=self.capacity, ef_construction=200, M=16)
+            index.add_items(self._matrix[:len(self.ids)], np.arange(len(self.ids)))
+            index.set_ef(64)
+            self._ann = index
+        return self._ann
+
+    def query(self, vector: List[float], k: int, filter: Optional[dict] = None) -> List[dict]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock:
+            rows = self._candidate_rows(filter)
+            count = len(self.ids) if rows is None else len(rows)
+            if count == 0:
+                return []
+            k = min(k, count)
+
+            if hnswlib is not None and count >= self.ann_threshold:
+                allowed = None if rows is None else set(rows)
+                labels, distances = self._ann_index().knn_query(
+                    query, k=k, filter=None if allowed is None else allowed.__contains__
+                )
+                hits = [(int(row), 1.0 - float(distance)) for row, distance in zip(labels[0], distances[0])]
+            else:
+                matrix = self._matrix[:len(self.ids)] if rows is None else self._matrix[rows]
+                scores = matrix @ query
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best])]
+                positions = best if rows is None else [rows[i] for i in best]
+                hits = [(int(row), float(scores[i])) for row, i in zip(positions, best)]
+
+            return [{"id": self.ids[row], "score": score, "metadata": self.metadata[row]} for row, score in hits]
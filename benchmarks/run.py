@@ -0,0 +1,230 @@
+"""
+Offline benchmark: starts the upstream stand-in, points the app at it and drives
+/api/chat with concurrent requests, then times the hot functions on their own.
+Results go to a JSON file so two runs (before/after a change) can be diffed.
+
+    python benchmarks/run.py --requests 40 --concurrency 8 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), "app")
+sys.path.insert(0, HERE)
+sys.path.insert(0, APP_DIR)
+
+from standin import StandInServer  # noqa: E402
+
+QUERIES = [
+    "glioblastoma",
+    "diffuse midline glioma",
+    "IDH-mutant astrocytoma",
+    "meningioma",
+    "medulloblastoma",
+    "oligodendroglioma",
+    "ependymoma",
+    "brain metastases",
+]
+
+DEFAULT_LATENCY = {
+    "esearch": 0.15,
+    "efetch": 0.4,
+    "europe_pmc": 0.35,
+    "clinical_trials": 0.3,
+    "chat": 1.0,
+    "embeddings": 0.1,
+    "slack_auth": 0.05,
+    "slack_open": 0.05,
+    "slack_post": 0.05,
+}
+
+
+def parse_latency(values) -> dict:
+    latency = dict(DEFAULT_LATENCY)
+    for value in values or ():
+        route, _, seconds = value.partition("=")
+        if route not in latency:
+            raise SystemExit(f"unknown route {route!r}, expected one of {', '.join(sorted(latency))}")
+        latency[route] = float(seconds)
+    return latency
+
+
+def configure_environment(standin: StandInServer, workdir: str, warm: bool) -> None:
+    """
+    Settings that must exist before the app modules are imported: every upstream points at
+    the stand-in, state lives in a throwaway directory, and caches are off for a cold run.
+    """
+    os.environ.update(standin.environment())
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "VECTOR_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": os.path.join(workdir, "vector_store"),
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.db"),
+        "NOTIFICATION_TYPE": "slack",
+        "SLACK_BOT_TOKEN": "xoxb-bench",
+        "SLACK_USER_ID": "UBENCH",
+        "EMBEDDING_BATCH_WINDOW": os.environ.get("EMBEDDING_BATCH_WINDOW", "0.02"),
+    })
+    if not warm:
+        for name in ("CACHE_TTL_PUBMED", "CACHE_TTL_EUROPE_PMC", "CACHE_TTL_CLINICAL_TRIALS", "PUBMED_ARTICLE_TTL"):
+            os.environ[name] = "0"
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[position]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_test(client, total: int, concurrency: int, bypass_cache: bool) -> dict:
+    def one(position: int):
+        body = {"query": QUERIES[position % len(QUERIES)], "bypass_cache": bypass_cache}
+        started = time.perf_counter()
+        response = client.post("/api/chat", json=body)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, status in results if status == 200]
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, status in results if status != 200),
+        "wall_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_p50": round(percentile(latencies, 0.50), 4),
+        "latency_p90": round(percentile(latencies, 0.90), 4),
+        "latency_p99": round(percentile(latencies, 0.99), 4),
+        "latency_mean": round(statistics.mean(latencies), 4) if latencies else 0.0,
+    }
+
+
+def timeit(func, repeat: int) -> dict:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return {
+        "repeat": repeat,
+        "min": round(min(durations), 5),
+        "median": round(statistics.median(durations), 5),
+        "max": round(max(durations), 5),
+    }
+
+
+def micro_benchmarks(standin: StandInServer, repeat: int, size: int) -> dict:
+    import io
+    from schemas import UserQuery
+    from services.pubmed import fetch_pubmed_articles, iter_pubmed_articles
+    from services.trials import process_fields
+    from services.utils import select_disease_informed_articles, deduplicate_articles
+    from services.prompt import build_prompt
+
+    fixtures = standin.fixtures
+    query = UserQuery(query="glioblastoma", bypass_cache=True)
+    efetch = fixtures.efetch_xml(fixtures.pmids("glioblastoma", size)).encode("utf-8")
+    articles = list(iter_pubmed_articles(io.BytesIO(efetch)))
+    trial_rows = fixtures.trials[1:] * (size // max(1, len(fixtures.trials) - 1))
+    ranked = select_disease_informed_articles(query, articles)
+
+    return {
+        "articles": len(articles),
+        "fetch_pubmed_articles": timeit(lambda: fetch_pubmed_articles(query, max_results=size), repeat),
+        "iter_pubmed_articles": timeit(lambda: list(iter_pubmed_articles(io.BytesIO(efetch))), repeat),
+        "deduplicate_articles": timeit(lambda: deduplicate_articles(articles + articles), repeat),
+        "select_disease_informed_articles": timeit(lambda: select_disease_informed_articles(query, articles), repeat),
+        "process_fields": timeit(lambda: process_fields(trial_rows), repeat),
+        "build_prompt": timeit(lambda: build_prompt(ranked, (trial_rows, [])), repeat),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=24, help="chat requests in the load test")
+    parser.add_argument("--concurrency", type=int, default=6, help="requests in flight at once")
+    parser.add_argument("--warm", action="store_true", help="keep the upstream caches on (default is a cold run)")
+    parser.add_argument("--latency", action="append", metavar="ROUTE=SECONDS",
+                        help="override a stand-in delay, e.g. --latency chat=2.5 (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per micro-benchmark")
+    parser.add_argument("--size", type=int, default=200, help="articles used by the micro-benchmarks")
+    parser.add_argument("--skip-micro", action="store_true", help="only run the load test")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    latency = parse_latency(args.latency)
+    output = os.path.abspath(args.output) if args.output else None
+    standin = StandInServer(latency).start()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    configure_environment(standin, workdir, args.warm)
+    os.chdir(workdir)  # the app writes example.txt and app.log to the working directory
+
+    started = time.perf_counter()
+    import main as app_main
+    from fastapi.testclient import TestClient
+    from services.jobs import job_queue
+    import_seconds = time.perf_counter() - started
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "warm": args.warm,
+        "latency": latency,
+        "import_seconds": round(import_seconds, 3),
+        "app_import_seconds": round(app_main.IMPORT_SECONDS, 3),
+        "import_budget": app_main.IMPORT_TIME_BUDGET,
+    }
+    try:
+        with TestClient(app_main.app) as client:
+            results["load_test"] = load_test(client, args.requests, args.concurrency, bypass_cache=not args.warm)
+            deadline = time.monotonic() + 30
+            while any(job_queue.get_stats().get(status) for status in ("pending", "running")) \
+                    and time.monotonic() < deadline:
+                time.sleep(0.1)  # let the queued memory and notification jobs finish
+            results["jobs"] = job_queue.get_stats()
+        if not args.skip_micro:
+            results["micro"] = micro_benchmarks(standin, args.repeat, args.size)
+    finally:
+        standin.stop()
+
+    results["upstream_calls"] = dict(sorted(standin.counts.items()))
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Local stand-in for every upstream the app talks to (PubMed E-utilities, Europe PMC,
+ClinicalTrials.gov v2, OpenAI, Slack), serving responses built from the files in
+fixtures/ with a configurable delay per route so runs are repeatable offline.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# route name -> path the app requests (relative to the base URLs the stand-in hands out)
+ROUTES = {
+    "/pubmed/esearch.fcgi": "esearch",
+    "/pubmed/efetch.fcgi": "efetch",
+    "/europepmc/search": "europe_pmc",
+    "/ctgov/api/v2/studies": "clinical_trials",
+    "/openai/v1/chat/completions": "chat",
+    "/openai/v1/embeddings": "embeddings",
+    "/slack/api/auth.test": "slack_auth",
+    "/slack/api/conversations.open": "slack_open",
+    "/slack/api/chat.postMessage": "slack_post",
+}
+
+EMBEDDING_DIMENSION = 1536
+PMID_POOL = 50_000  # queries draw their PMIDs from this range, so related queries overlap
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class Fixtures:
+    """
+    Upstream payloads scaled to whatever size a request asks for: the recorded articles,
+    studies and search hits are repeated with fresh identifiers.
+    """
+    def __init__(self):
+        self.esearch = _read("pubmed_esearch.xml")
+        efetch = _read("pubmed_efetch.xml")
+        self.efetch_head = efetch[:efetch.index("<PubmedArticle>")]
+        self.efetch_tail = "</PubmedArticleSet>\n"
+        self.pubmed_articles = re.findall(r"<PubmedArticle>.*?</PubmedArticle>", efetch, re.S)
+        self.europe_pmc = json.loads(_read("europepmc_search.json"))
+        self.trials = list(csv.reader(io.StringIO(_read("clinical_trials.csv"))))
+        self.chat = json.loads(_read("openai_chat_completion.json"))
+
+    @staticmethod
+    def pmids(term: str, count: int) -> list:
+        # the disease part of the term decides the PMIDs, the date filter does not
+        rng = np.random.default_rng(_seed(term.split(" AND ")[0].lower()))
+        start = int(rng.integers(0, PMID_POOL))
+        return [str(39_000_000 + (start + i) % PMID_POOL) for i in range(count)]
+
+    @staticmethod
+    def doi(pmid: str) -> str:
+        # one DOI per synthetic PMID, shared by the Europe PMC hit mirroring that record
+        return f"10.5555/bench.{pmid}"
+
+    def esearch_xml(self, term: str, retmax: int) -> str:
+        ids = self.pmids(term, retmax)
+        return (self.esearch.replace("__COUNT__", str(len(ids)))
+                .replace("__IDS__", "\n".join(f"<Id>{pmid}</Id>" for pmid in ids)))
+
+    def efetch_xml(self, pmids: list) -> str:
+        articles = []
+        for position, pmid in enumerate(pmids):
+            template = self.pubmed_articles[position % len(self.pubmed_articles)]
+            template = re.sub(r"<PMID Version=\"1\">\d+</PMID>", f'<PMID Version="1">{pmid}</PMID>', template)
+            template = re.sub(r"(<ELocationID EIdType=\"doi\"[^>]*>)[^<]*(</ELocationID>)",
+                              rf"\g<1>{self.doi(pmid)}\g<2>", template)
+            # every record gets its own DOI, including templates recorded without one
+            template = re.sub(r"<ArticleId IdType=\"doi\">[^<]*</ArticleId>", "", template)
+            articles.append(re.sub(r"<ArticleId IdType=\"pubmed\">\d+</ArticleId>",
+                                   f'<ArticleId IdType="pubmed">{pmid}</ArticleId>'
+                                   f'<ArticleId IdType="doi">{self.doi(pmid)}</ArticleId>', template))
+        return self.efetch_head + "\n".join(articles) + "\n" + self.efetch_tail
+
+    def europe_pmc_json(self, query: str, page_size: int) -> str:
+        # every other hit is also in PubMed's results for the same disease, as in real data
+        results = self.europe_pmc["resultList"]["result"]
+        pmids = self.pmids(query, page_size)
+        hits = []
+        for position in range(page_size):
+            hit = dict(results[position % len(results)])
+            if position % 2 == 0:
+                hit.update(id=pmids[position], pmid=pmids[position], source="MED", doi=self.doi(pmids[position]))
+            else:
+                hit.update(id=f"PPR{900_000 + position}", doi=f"10.1101/bench.{position}")
+                hit.pop("pmid", None)
+            hits.append(hit)
+        payload = dict(self.europe_pmc, hitCount=len(hits), resultList={"result": hits})
+        return json.dumps(payload)
+
+    def trials_csv(self, page_size: int) -> str:
+        header, rows = self.trials[0], self.trials[1:]
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(header)
+        for position in range(page_size):
+            row = list(rows[position % len(rows)])
+            row[0] = f"NCT{6_800_000 + position:08d}"
+            writer.writerow(row)
+        return out.getvalue()
+
+    def chat_json(self) -> str:
+        return json.dumps(dict(self.chat, created=int(time.time())))
+
+    def chat_stream(self):
+        content = self.chat["choices"][0]["message"]["content"]
+        for piece in re.findall(r"\S+\s*", content):
+            chunk = {
+                "id": self.chat["id"], "object": "chat.completion.chunk", "model": self.chat["model"],
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @staticmethod
+    def embeddings_json(inputs: list, model: str) -> str:
+        data = []
+        for position, text in enumerate(inputs):
+            vector = np.random.default_rng(_seed(text)).standard_normal(EMBEDDING_DIMENSION).astype(np.float32)
+            data.append({"object": "embedding", "index": position, "embedding": vector.round(6).tolist()})
+        return json.dumps({"object": "list", "data": data, "model": model,
+                           "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+
+class StandInServer:
+    """
+    Threaded HTTP server on a free local port. `latency` maps route names (see ROUTES) to
+    seconds slept before answering; `counts` records how many calls each route served.
+    """
+    def __init__(self, latency: Optional[Dict[str, float]] = None, host: str = "127.0.0.1", port: int = 0):
+        self.latency = dict(latency or {})
+        self.fixtures = Fixtures()
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> Dict[str, str]:
+        """
+        Settings that point the app at this server.
+        """
+        return {
+            "PUBMED_BASE_URL": f"{self.url}/pubmed",
+            "EUROPE_PMC_BASE_URL": f"{self.url}/europepmc",
+            "CLINICAL_TRIALS_BASE_URL": f"{self.url}/ctgov/api/v2/",
+            "OPENAI_API_BASE": f"{self.url}/openai/v1",
+            "SLACK_API_URL": f"{self.url}/slack/api/",
+        }
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, route: str) -> None:
+        with self._lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, body: str, content_type: str, status: int = 200) -> None:
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, body: dict) -> None:
+                parsed = urlparse(self.path)
+                route = ROUTES.get(parsed.path)
+                if route is None:
+                    self._send(json.dumps({"error": f"no stand-in for {parsed.path}"}), "application/json", 404)
+                    return
+                server._count(route)
+                time.sleep(server.latency.get(route, 0.0))
+
+                query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                query.update(body)
+                fixtures = server.fixtures
+                if route == "esearch":
+                    self._send(fixtures.esearch_xml(query.get("term", ""), int(query.get("retmax", 20))), "text/xml")
+                elif route == "efetch":
+                    self._send(fixtures.efetch_xml(query.get("id", "").split(",")), "text/xml")
+                elif route == "europe_pmc":
+                    self._send(fixtures.europe_pmc_json(query.get("query", ""), int(query.get("pageSize", 25))),
+                               "application/json")
+                elif route == "clinical_trials":
+                    self._send(fixtures.trials_csv(int(query.get("pageSize", 10))), "text/csv")
+                elif route == "chat":
+                    if query.get("stream"):
+                        self._send("".join(fixtures.chat_stream()), "text/event-stream")
+                    else:
+                        self._send(fixtures.chat_json(), "application/json")
+                elif route == "embeddings":
+                    inputs = query.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send(fixtures.embeddings_json(inputs, query.get("model", "")), "application/json")
+                elif route == "slack_auth":
+                    self._send(json.dumps({"ok": True, "user_id": "UBOT", "team": "bench"}), "application/json")
+                elif route == "slack_open":
+                    self._send(json.dumps({"ok": True, "channel": {"id": "DBENCH"}}), "application/json")
+                elif route == "slack_post":
+                    self._send(json.dumps({"ok": True, "channel": "DBENCH", "ts": f"{time.time():.6f}"}),
+                               "application/json")
+
+            def do_GET(self):
+                self._dispatch({})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    body = json.loads(raw or "{}")
+                else:
+                    body = {key: values[-1] for key, values in parse_qs(raw).items()}
+                self._dispatch(body)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    standin = StandInServer().start()
+    for name, value in standin.environment().items():
+        print(f"{name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        standin.stop()